@@ -0,0 +1,139 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from charts.backend import backend
+from charts.config import PARALLEL_WORKERS, PARTITION_BY, REACH_SKETCH
+from charts.context import customer_summary, product_summary
+from charts.cube import CUBE_DIMENSIONS, SHIPPING_DIMENSIONS, build_cube, build_shipping_cube
+from charts.dataset import cache_path, concat_frames, dataset_state, read_cache, read_state, write_cache
+from charts.profiling import profiled
+from charts.sketches import SKETCH_KEYS, build_reach_sketch
+
+# Name -> (builder, group keys, sorted, merge). Partial aggregates over disjoint rows merge
+# by concatenating and grouping again with the backend's group_<merge>: sums add up, sketch
+# registers keep their maximum. Cubes keep first-appearance order, the summaries are sorted
+# by name like their builders.
+AGGREGATES = {
+    "cube": (build_cube, CUBE_DIMENSIONS, False, "sum"),
+    "shipping": (build_shipping_cube, SHIPPING_DIMENSIONS, False, "sum"),
+    "products": (product_summary, ["Product Name"], True, "sum"),
+    "customers": (customer_summary, ["Customer Name"], True, "sum"),
+}
+if REACH_SKETCH:
+    AGGREGATES["reach"] = (build_reach_sketch, SKETCH_KEYS, False, "max")
+
+# Bump whenever a builder changes the layout of its table so stored aggregates are rebuilt
+AGGREGATES_VERSION = "2"
+
+
+def build_aggregates(df):
+    return {name: build(df) for name, (build, keys, sort, merge) in AGGREGATES.items()}
+
+
+def merge_aggregates(parts):
+    merged = {}
+    for name, (build, keys, sort, merge) in AGGREGATES.items():
+        combined = concat_frames([part[name] for part in parts])
+        measures = [column for column in combined.columns if column not in keys]
+        merged[name] = getattr(backend, f"group_{merge}")(combined, keys, measures, sort=sort)
+    return merged
+
+
+def check_partition_column(column):
+    # Cube cells must never span partitions, or the merge could not restore their order
+    for name, (build, keys, sort, merge) in AGGREGATES.items():
+        if not sort and column not in keys:
+            raise ValueError(f"Cannot partition by {column!r}: the {name} table is not keyed by it")
+
+
+def partition(df, column):
+    # One frame per value in value order; each keeps its rows' positions in df as its index
+    partitions = []
+    for _, rows in sorted(df.groupby(column, observed=True).indices.items()):
+        frame = df.take(rows)
+        frame.index = rows
+        partitions.append(frame)
+    return partitions
+
+
+def build_partition(frame):
+    # Runs in a worker; also returns where each cube cell's first row sits in the full frame.
+    # The reach sketch's registers come from hashes rather than columns, so it is left in
+    # partition order, which no estimate depends on
+    positions = {
+        name: frame.groupby(keys, observed=True, sort=False).head(1).index.to_numpy()
+        for name, (build, keys, sort, merge) in AGGREGATES.items()
+        if not sort and set(keys) <= set(frame.columns)
+    }
+    return build_aggregates(frame), positions
+
+
+def merge_partitions(results):
+    # Partitions are merged in partition order and cube cells put back in order of first
+    # appearance, so the result does not depend on which worker finishes first
+    merged = merge_aggregates([aggregates for aggregates, _ in results])
+    for name in results[0][1]:
+        positions = np.concatenate([cell_positions[name] for _, cell_positions in results])
+        merged[name] = merged[name].take(np.argsort(positions, kind="stable")).reset_index(drop=True)
+    return merged
+
+
+@profiled("aggregate")
+def build_aggregates_parallel(df, workers=PARALLEL_WORKERS, column=PARTITION_BY):
+    # Spawned workers start a fresh interpreter and re-import the caller's __main__, so this
+    # is only called from command-line entry points, never from a Streamlit script: a
+    # Streamlit session registers app.py as __main__ and every worker would run the app
+    check_partition_column(column)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        results = list(pool.map(build_partition, partition(df, column)))
+    return merge_partitions(results)
+
+
+def read_aggregates(file_path, generation):
+    stored = {}
+    watermarks = set()
+    for name in AGGREGATES:
+        path = cache_path(file_path, name)
+        state = read_state(path)
+        if not state or state.get("generation") != generation or state.get("version") != AGGREGATES_VERSION:
+            return None, None
+        watermarks.add(int(state["row_id_watermark"]))
+        stored[name] = read_cache(path)
+    if len(watermarks) != 1:
+        return None, None
+    return stored, watermarks.pop()
+
+
+def write_aggregates(file_path, aggregates, generation, watermark):
+    for name, frame in aggregates.items():
+        write_cache(
+            frame, cache_path(file_path, name),
+            version=AGGREGATES_VERSION, generation=generation, row_id_watermark=watermark,
+        )
+
+
+@profiled("load")
+def load_aggregates(file_path, df, workers=0):
+    # A full rebuild runs in workers processes when there are more than one
+    state = dataset_state(file_path)
+    generation = state["generation"]
+    watermark = int(state["row_id_watermark"])
+
+    stored, stored_watermark = read_aggregates(file_path, generation)
+    if stored is not None and stored_watermark == watermark:
+        return stored
+
+    if stored is not None and stored_watermark < watermark:
+        # Same lineage with appended rows: aggregate only the new rows and fold them in
+        delta = build_aggregates(df[df["Row ID"] > stored_watermark])
+        aggregates = merge_aggregates([stored, delta])
+    elif workers > 1:
+        aggregates = build_aggregates_parallel(df, workers)
+    else:
+        aggregates = build_aggregates(df)
+
+    write_aggregates(file_path, aggregates, generation, watermark)
+    return aggregates
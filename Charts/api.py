@@ -0,0 +1,239 @@
+# Read-only JSON API over the dashboard's metrics, for scripts and services that would
+# otherwise scrape the Streamlit pages.
+#
+#   python -m charts.api                      # http://127.0.0.1:8502
+#   curl 'http://127.0.0.1:8502/kpis?year=2017&region=West'
+#
+# Endpoints: /kpis, /series, /leaderboards, /delivery and /states. Each takes the sidebar's
+# filters as query parameters: year, month (number or Jan..Dec), start_date and end_date
+# (YYYY-MM-DD), region, state and city. Responses are cached per endpoint and filter state.
+import argparse
+import json
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from charts.compute import (
+    MONTH_NAMES, calculate_metrics, range_metrics, range_transactions, customer_counts, customer_metrics, estimated_customer_counts,
+    generate_delivery_analysis, generate_metrics, load_data, product_metrics, sales_measures, select,
+    shipping_duration_percentiles, state_transaction_counts, top_10_customer, top_10_products, top_bottom_10_products,
+)
+from charts.config import FIGURE_CACHE_SIZE, SHIPPING_SLA_DAYS, STREAMING
+from charts.dataset import source_fingerprint
+from charts.figure_cache import FigureCache, make_filter_key
+from charts.profiling import finish_trace, span, start_trace
+
+SOURCE = "Superstore.csv"
+MONTH_NUMBERS = {name.lower(): number for number, name in MONTH_NAMES.items()}
+# Years a Timestamp can hold; others would overflow when the year's dates are built
+YEARS = range(1, 10000)
+
+# Encoded response bodies by (path, filter key). The key starts with the source
+# fingerprint, so answers from before an edit to the source are never served
+response_cache = FigureCache(FIGURE_CACHE_SIZE)
+
+# The loaded dataset, replaced when the source fingerprint changes
+_data = {}
+_data_lock = threading.Lock()
+
+
+def load(file_path):
+    with _data_lock:
+        if _data.get("name") != source_fingerprint(file_path):
+            _data.clear()
+            _data.update(load_data(file_path))
+        return dict(_data)
+
+
+def parse_filters(query):
+    values = {name: entries[-1] for name, entries in query.items() if entries[-1] not in ("", "All")}
+    unknown = set(values) - {"year", "month", "start_date", "end_date", "region", "state", "city"}
+    if unknown:
+        raise ValueError(f"Unknown filter {', '.join(sorted(unknown))}")
+    filters = {name: values.get(name) for name in ("region", "state", "city")}
+    try:
+        filters["year"] = int(values["year"]) if "year" in values else None
+        if filters["year"] is not None and filters["year"] not in YEARS:
+            raise ValueError(f"year {filters['year']} is not between {YEARS[0]} and {YEARS[-1]}")
+        month = values.get("month")
+        if month is not None:
+            month = MONTH_NUMBERS[month.lower()] if month.lower() in MONTH_NUMBERS else int(month)
+            if month not in MONTH_NAMES:
+                raise ValueError(f"month {month} is not between 1 and 12")
+        filters["month"] = month
+        for name in ("start_date", "end_date"):
+            filters[name] = pd.Timestamp(values[name]) if name in values else None
+    except ValueError as error:
+        raise ValueError(f"Bad filter value: {error}") from error
+    if STREAMING and (filters["start_date"] is not None or filters["end_date"] is not None):
+        raise ValueError("Date ranges need the row-level dataset and are not available in streaming mode")
+    return filters
+
+
+def to_json(value):
+    if isinstance(value, pd.DataFrame):
+        return [to_json(record) for record in value.to_dict(orient="records")]
+    if isinstance(value, pd.Series):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, dict):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def kpis(data, view):
+    context, filtered_cube, daily_range = view["context"], view["filtered_cube"], view["daily_range"]
+    if daily_range is None:
+        sales = calculate_metrics(filtered_cube)
+        shipping = generate_metrics(filtered_cube)
+    else:
+        sales = range_metrics(data["daily"], daily_range)
+        shipping = generate_metrics(filtered_cube, range_transactions(data["daily"], daily_range))
+    return {
+        "sales": {
+            name: sales[name]
+            for name in ("total_sales", "total_profit", "total_ratio_profit", "total_loss",
+                         "average_discount", "total_quantity")
+        },
+        "shipping": shipping,
+        "products": product_metrics(context, filtered_cube),
+        "customers": customer_metrics(context, view["filtered_reach"]),
+    }
+
+
+def series(data, view):
+    # Like the dashboard: years over the whole dataset, months of the selected year
+    result = {
+        "yearly": sales_measures(data["summaries"]["cube"], "Year"),
+        "monthly": sales_measures(view["cube_year"], "Month"),
+    }
+    if view["reach_year"] is not None:
+        result["customers_yearly"], result["customers_monthly"] = estimated_customer_counts(
+            data["summaries"]["reach"], view["reach_year"]
+        )
+    elif data["df"] is not None:
+        result["customers_yearly"], result["customers_monthly"] = customer_counts(
+            data["df"], view["context"].year_df
+        )
+    return result
+
+
+def leaderboards(data, view):
+    context = view["context"]
+    top_loss_products, top_profitable_products, top_discount_products = top_10_products(context)
+    top_quantity_products, bottom_quantity_products, _ = top_bottom_10_products(context)
+    top_customers_profit, top_customers_quantity = top_10_customer(context)
+    return {
+        "loss_products": top_loss_products,
+        "profit_products": top_profitable_products,
+        "discount_products": top_discount_products,
+        "top_quantity_products": top_quantity_products,
+        "bottom_quantity_products": bottom_quantity_products,
+        "profit_customers": top_customers_profit,
+        "quantity_customers": top_customers_quantity,
+    }
+
+
+def delivery(data, view):
+    average_shipping_delay, shipment_counts = generate_delivery_analysis(view["filtered_shipping"])
+    return {
+        "sla_days": SHIPPING_SLA_DAYS,
+        "average_duration": average_shipping_delay,
+        "deliveries": shipment_counts[["Ship Mode", "On Time Delivery", "Late Delivery"]],
+        "duration_percentiles": shipping_duration_percentiles(view["filtered_shipping"]),
+    }
+
+
+def states(data, view):
+    state_counts = state_transaction_counts(view["filtered_cube"])
+    return {"states": state_counts.rename_axis("State").reset_index()}
+
+
+ENDPOINTS = {
+    "/kpis": kpis,
+    "/series": series,
+    "/leaderboards": leaderboards,
+    "/delivery": delivery,
+    "/states": states,
+}
+
+
+def respond(endpoint, data, filters):
+    view = select(data, **filters)
+    if view["rows"] == 0:
+        return 404, encode({"error": "No rows match the filters"})
+    return 200, encode(ENDPOINTS[endpoint](data, view))
+
+
+def encode(payload):
+    return json.dumps(to_json(payload)).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        trace = start_trace()
+        try:
+            self.send(*self.answer(urlparse(self.path)))
+        finally:
+            finish_trace(trace)
+
+    def answer(self, url):
+        endpoint = url.path.rstrip("/")
+        if endpoint not in ENDPOINTS:
+            return 404, encode({"error": f"Unknown endpoint {url.path}", "endpoints": list(ENDPOINTS)})
+        try:
+            filters = parse_filters(parse_qs(url.query, keep_blank_values=True))
+        except ValueError as error:
+            return 400, encode({"error": str(error)})
+        try:
+            with span("load", "api.load"):
+                data = load(self.server.file_path)
+            key = make_filter_key(data["name"], **filters)
+            with span("render", f"api{endpoint}"):
+                return response_cache.get_or_build(endpoint, key, respond, endpoint, data, filters)
+        except Exception as error:
+            # Answer instead of dropping the connection; the traceback goes to the server log
+            self.log_error("Failed to answer %s", url.geturl())
+            traceback.print_exc()
+            return 500, encode({"error": f"Internal error: {type(error).__name__}"})
+
+    def send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host, port, file_path=SOURCE):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.file_path = file_path
+    # Load up front so the first request does not pay for it
+    load(file_path)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Superstore metrics as JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--source", default=SOURCE)
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.source)
+    print(f"Serving http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from charts.config import BACKEND
+from charts.topk import top_bottom_k
+
+# The query shapes every chart is built from. Tables are DataFrames or Parquet file paths,
+# results are DataFrames. Group results are sorted by the keys when sort is true and in
+# order of first appearance otherwise; top_k breaks ties by table order and skips NaN.
+
+
+def _keys(by):
+    return [by] if isinstance(by, str) else list(by)
+
+
+def _selection(selection):
+    return [(column, value) for column, value in selection.items() if value is not None]
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _arrow(table, columns):
+    if isinstance(table, str):
+        return pq.read_table(table, columns=columns)
+    return pa.Table.from_pandas(table[columns], preserve_index=False)
+
+
+class PandasBackend:
+    def _frame(self, table, columns=None):
+        if isinstance(table, str):
+            return pd.read_parquet(table, columns=columns)
+        return table
+
+    def filter(self, table, selection):
+        table = self._frame(table)
+        mask = None
+        for column, value in _selection(selection):
+            column_mask = table[column] == value
+            mask = column_mask if mask is None else mask & column_mask
+        return table if mask is None else table[mask]
+
+    def group_sum(self, table, by, columns, sort=True):
+        by = _keys(by)
+        table = self._frame(table, by + list(columns))
+        return table.groupby(by, observed=True, sort=sort)[columns].sum().reset_index()
+
+    def group_max(self, table, by, columns, sort=True):
+        by = _keys(by)
+        table = self._frame(table, by + list(columns))
+        return table.groupby(by, observed=True, sort=sort)[columns].max().reset_index()
+
+    def group_count(self, table, by, name="Count", sort=True):
+        by = _keys(by)
+        table = self._frame(table, by)
+        return table.groupby(by, observed=True, sort=sort).size().reset_index(name=name)
+
+    def group_nunique(self, table, by, column, sort=True):
+        by = _keys(by)
+        table = self._frame(table, by + [column])
+        return table.groupby(by, observed=True, sort=sort)[column].nunique().reset_index()
+
+    def top_k(self, table, column, k=10):
+        return top_bottom_k(self._frame(table), column, k)
+
+
+class ArrowBackend(PandasBackend):
+    # pyarrow.compute kernels with multithreaded grouping
+    def _group(self, table, by, aggregations, sort):
+        # aggregations are (column, function, output name); count_all takes no column
+        columns = list(dict.fromkeys(by + [column for column, _, _ in aggregations if column]))
+        arrow = _arrow(table, columns)
+        arrow = arrow.append_column("__position", pa.array(np.arange(arrow.num_rows)))
+        result = arrow.group_by(by).aggregate(
+            [(column or [], function) for column, function, _ in aggregations]
+            + [("__position", "min")]
+        )
+        result = result.to_pandas().rename(columns={
+            f"{column}_{function}" if column else function: name
+            for column, function, name in aggregations
+        })
+        # Groups come back in no fixed order from the threaded kernel
+        order = by if sort else ["__position_min"]
+        result = result.sort_values(order, kind="stable", ignore_index=True)
+        return result[by + [name for _, _, name in aggregations]]
+
+    def filter(self, table, selection):
+        selection = _selection(selection)
+        if not selection:
+            return self._frame(table)
+        arrow = _arrow(table, [column for column, _ in selection])
+        mask = None
+        for column, value in selection:
+            values = arrow[column]
+            if pa.types.is_dictionary(values.type):
+                values = values.cast(values.type.value_type)
+            column_mask = pc.equal(values, pa.scalar(value, type=values.type))
+            mask = column_mask if mask is None else pc.and_(mask, column_mask)
+        positions = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+        return self._frame(table).iloc[positions]
+
+    def group_sum(self, table, by, columns, sort=True):
+        return self._group(table, _keys(by), [(column, "sum", column) for column in columns], sort)
+
+    def group_max(self, table, by, columns, sort=True):
+        return self._group(table, _keys(by), [(column, "max", column) for column in columns], sort)
+
+    def group_count(self, table, by, name="Count", sort=True):
+        return self._group(table, _keys(by), [(None, "count_all", name)], sort)
+
+    def group_nunique(self, table, by, column, sort=True):
+        return self._group(table, _keys(by), [(column, "count_distinct", column)], sort)
+
+    def top_k(self, table, column, k=10):
+        table = self._frame(table)
+        values = pa.array(table[column].to_numpy(dtype="float64"), from_pandas=True)
+        k = min(k, len(values) - values.null_count)
+        # Partial selection, like topk.py, rather than a full sort. The position key keeps ties
+        # in table order; NaN became nulls, which select_k places after every value
+        ranked = pa.table({"value": values, "position": pa.array(np.arange(len(values)))})
+        top, bottom = (
+            pc.select_k_unstable(ranked, k, [("value", order), ("position", "ascending")]).to_numpy()
+            for order in ("descending", "ascending")
+        )
+        return table.iloc[top], table.iloc[bottom]
+
+
+class DuckDBBackend(PandasBackend):
+    # In-process SQL engine; runs every query multithreaded and reads Parquet files directly
+    def __init__(self):
+        try:
+            import duckdb
+        except ImportError as error:
+            raise ImportError(
+                "SUPERSTORE_BACKEND=duckdb needs the duckdb package (pip install duckdb)"
+            ) from error
+        self.connection = duckdb.connect()
+
+    def _query(self, select, clauses, table, columns, parameters=()):
+        # SELECT select FROM the table, with each row's 0-based position as __position, then
+        # the clauses. A cursor per query so concurrent sessions do not share statement state.
+        # Frames are registered as Arrow tables of the columns the query reads: DuckDB scans
+        # those without copying, where a pandas frame of Arrow-backed strings goes through
+        # deprecated pandas internals
+        cursor = self.connection.cursor()
+        if isinstance(table, str):
+            source = "read_parquet(?)"
+            parameters = [table] + list(parameters)
+        else:
+            source = "source"
+            cursor.register(source, _arrow(table, columns))
+        sql = (
+            f"SELECT {select} FROM (SELECT *, row_number() OVER () - 1 AS __position FROM {source}) "
+            f"{clauses}"
+        )
+        try:
+            return cursor.execute(sql, parameters).df()
+        finally:
+            cursor.close()
+
+    def _group(self, table, by, columns, aggregations, sort):
+        keys = ", ".join(_quote(column) for column in by)
+        # Without sort the groups come back in order of first appearance
+        order = keys if sort else "min(__position)"
+        result = self._query(
+            f"{keys}, {', '.join(aggregations)}", f"GROUP BY {keys} ORDER BY {order}",
+            table, list(dict.fromkeys(by + columns)),
+        )
+        # Arrow dictionaries come back as plain strings; keys get the frame's categories back
+        if not isinstance(table, str):
+            for column in by:
+                if isinstance(table[column].dtype, pd.CategoricalDtype):
+                    result[column] = result[column].astype(table[column].dtype)
+        return result
+
+    def filter(self, table, selection):
+        selection = _selection(selection)
+        if not selection:
+            return self._frame(table)
+        where = " AND ".join(f"{_quote(column)} = ?" for column, _ in selection)
+        positions = self._query(
+            "__position", f"WHERE {where} ORDER BY __position",
+            table,
+            [column for column, _ in selection],
+            [value for _, value in selection],
+        )["__position"]
+        return self._frame(table).iloc[positions.to_numpy()]
+
+    def group_sum(self, table, by, columns, sort=True):
+        result = self._group(
+            table, _keys(by), list(columns),
+            [f"sum({_quote(column)}) AS {_quote(column)}" for column in columns], sort,
+        )
+        # SUM widens integers to HUGEINT, which arrives as float
+        if not isinstance(table, str):
+            for column in columns:
+                if pd.api.types.is_integer_dtype(table[column].dtype):
+                    result[column] = result[column].astype("int64")
+        return result
+
+    def group_max(self, table, by, columns, sort=True):
+        return self._group(
+            table, _keys(by), list(columns),
+            [f"max({_quote(column)}) AS {_quote(column)}" for column in columns], sort,
+        )
+
+    def group_count(self, table, by, name="Count", sort=True):
+        return self._group(table, _keys(by), [], [f"count(*) AS {_quote(name)}"], sort)
+
+    def group_nunique(self, table, by, column, sort=True):
+        return self._group(
+            table, _keys(by), [column], [f"count(DISTINCT {_quote(column)}) AS {_quote(column)}"], sort
+        )
+
+    def top_k(self, table, column, k=10):
+        value = _quote(column)
+        top, bottom = (
+            self._query(
+                "__position",
+                f"WHERE {value} IS NOT NULL AND NOT isnan({value}) "
+                f"ORDER BY {value} {order}, __position LIMIT {int(k)}",
+                table, [column],
+            )["__position"].to_numpy()
+            for order in ("DESC", "ASC")
+        )
+        table = self._frame(table)
+        return table.iloc[top], table.iloc[bottom]
+
+
+BACKENDS = {"pandas": PandasBackend, "arrow": ArrowBackend, "duckdb": DuckDBBackend}
+
+
+def get_backend(name=BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+backend = get_backend()
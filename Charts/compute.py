@@ -0,0 +1,385 @@
+import numpy as np
+import pandas as pd
+
+from charts.aggregates import load_aggregates
+from charts.backend import backend
+from charts.config import SHIPPING_SLA_DAYS, STREAMING
+from charts.context import AggregationContext
+from charts.cube import CUBE_MEASURES, measure_columns, rollup, shipping_columns, slice_cube
+from charts.dataset import load_dataset, served_frame, source_fingerprint
+from charts.figure_cache import make_filter_key
+from charts.prefix_sums import build_daily_prefix, year_totals
+from charts.profiling import profiled
+from charts.row_index import build_row_index, date_bounds, filter_date_range, select_rows, take_rows
+from charts.sketches import estimate_reach, rows_sketch
+from charts.streaming import load_streamed_aggregates
+
+# The dashboard's metrics without any UI: every function takes cube cells, rows or an
+# AggregationContext and returns plain values and DataFrames. The Streamlit pages and the
+# JSON API (charts.api) both build on these.
+
+MONTH_NAMES = {
+    1: "Jan",
+    2: "Feb",
+    3: "Mar",
+    4: "Apr",
+    5: "May",
+    6: "Jun",
+    7: "Jul",
+    8: "Aug",
+    9: "Sep",
+    10: "Oct",
+    11: "Nov",
+    12: "Dec"
+}
+
+# Shipping-duration percentiles shown per ship mode
+DURATION_PERCENTILES = [50, 90, 99]
+
+
+def load_data(file_path, workers=0):
+    # What app.py loads, outside Streamlit: the served rows (None in streaming mode), the
+    # summaries, the row index over the rows, or over the cube cells in streaming mode, and
+    # the daily prefix sums over the rows (None in streaming mode). Aggregates that need a
+    # full rebuild are built in workers processes when there are more than one
+    fingerprint = source_fingerprint(file_path)
+    if STREAMING:
+        df = daily = None
+        summaries = load_streamed_aggregates(file_path)
+        row_index = build_row_index(summaries["cube"])
+    else:
+        full = load_dataset(file_path)
+        summaries = load_aggregates(file_path, full, workers)
+        df = served_frame(full)
+        row_index = build_row_index(df)
+        daily = build_daily_prefix(df)
+    return {"name": fingerprint, "df": df, "summaries": summaries, "row_index": row_index, "daily": daily}
+
+
+def select(data, year=None, month=None, start_date=None, end_date=None,
+           region=None, state=None, city=None):
+    # The sidebar's filters without the widgets. data holds the dataset name, the rows (None
+    # in streaming mode), the summaries and the row index over the rows (or cube cells)
+    row_index, df, summaries = data["row_index"], data["df"], data["summaries"]
+    cube, reach = summaries["cube"], summaries.get("reach")
+    year_rows = select_rows(row_index, year=year)
+    rows = select_rows(row_index, year=year, month=month)
+    whole_range = True
+    daily_range = None
+    if df is not None and (start_date is not None or end_date is not None):
+        min_date, max_date = date_bounds(row_index, rows)
+        start_date = min_date if start_date is None else pd.Timestamp(start_date)
+        end_date = max_date if end_date is None else pd.Timestamp(end_date)
+        rows = filter_date_range(row_index, rows, start_date, end_date)
+        whole_range = start_date <= min_date and end_date >= max_date
+        daily_range = range_for_prefix(row_index, rows, whole_range, year, month, region, state, city)
+    rows = select_rows(row_index, region=region, state=state, city=city, rows=rows)
+    filtered_df = None if df is None else take_rows(df, rows)
+
+    if whole_range:
+        # The cubes have no day grain, so they can only answer when the date range keeps every row
+        selection = dict(year=year, month=month, region=region, state=state, city=city)
+        filtered_cube = slice_cube(cube, **selection)
+        filtered_shipping = slice_cube(summaries["shipping"], **selection)
+        filtered_reach = None if reach is None else slice_cube(reach, **selection)
+    else:
+        filtered_cube = measure_columns(filtered_df)
+        filtered_shipping = shipping_columns(filtered_df)
+        filtered_reach = None if reach is None else rows_sketch(row_index["registers"], rows)
+
+    filter_key = make_filter_key(data["name"], year, month, start_date, end_date, region, state, city)
+    everything = df is None or len(rows) == len(df)
+    return {
+        "rows": len(rows),
+        "filtered_df": filtered_df,
+        "filtered_cube": filtered_cube,
+        "filtered_shipping": filtered_shipping,
+        "cube_year": slice_cube(cube, year=year),
+        # Days and region or state the daily prefix sums answer the KPIs for, or None
+        "daily_range": daily_range,
+        # Customer sketches (None unless REACH_SKETCH): the filter's and the selected year's
+        "filtered_reach": filtered_reach,
+        "reach_year": None if reach is None else slice_cube(reach, year=year),
+        # An unfiltered selection is answered by the stored dataset-wide summaries
+        "context": AggregationContext(
+            filtered_df, filter_key, summaries if everything else None,
+            None if df is None else lambda: take_rows(df, year_rows),
+        ),
+    }
+
+
+def range_for_prefix(row_index, rows, whole_range, year, month, region, state, city):
+    # rows are the year/month/date-range rows. A range that cuts into them covers every
+    # order between their first and last day, unless a month is picked across years; the
+    # prefix sums have no city grain
+    if whole_range or len(rows) == 0 or (month is not None and year is None) or city is not None:
+        return None
+    first_day, last_day = date_bounds(row_index, rows)
+    return {"start_date": first_day, "end_date": last_day, "region": region, "state": state}
+
+
+@profiled("aggregate")
+def sales_measures(cells, grain):
+    # Every sales-tab measure for one grain in a single grouped reduction over the cells
+    measures = rollup(cells, grain)
+    if grain == "Month":
+        measures["Month"] = measures["Month"].map(MONTH_NAMES)
+    return measures
+
+
+@profiled("aggregate")
+def calculate_metrics(filtered_cube):
+    return year_metrics(sales_measures(filtered_cube, "Year"))
+
+
+@profiled("aggregate")
+def range_metrics(daily, daily_range):
+    # calculate_metrics from the daily prefix sums: a few subtractions, whatever the range holds
+    return year_metrics(year_totals(daily, **daily_range))
+
+
+def range_transactions(daily, daily_range):
+    return int(year_totals(daily, **daily_range)["Transactions"].sum())
+
+
+def year_metrics(by_year):
+    totals = by_year[CUBE_MEASURES].sum()
+
+    yearly_sales = by_year[["Year", "Sales"]]
+    yearly_profit = by_year[["Year", "Profit"]]
+    ratio_profit = pd.DataFrame()
+    ratio_profit["Year"] = yearly_profit["Year"]
+    ratio_profit["Rasio"] = (yearly_profit["Profit"] / yearly_sales["Sales"]) * 100
+    total_ratio_profit = round(ratio_profit["Rasio"].mean())
+
+    total_loss = round(totals["Loss"], 2) * (-1)
+    average_discount = totals["Discount"] / totals["Transactions"]
+
+    return {
+        "total_sales": round(totals["Sales"]),
+        "total_profit": round(totals["Profit"]),
+        "total_ratio_profit": total_ratio_profit,
+        "yearly_sales": yearly_sales,
+        "yearly_profit": yearly_profit,
+        "ratio_profit": ratio_profit,
+        "total_loss": total_loss,
+        "average_discount": average_discount,
+        "total_quantity": by_year["Quantity"].sum(),
+    }
+
+
+def product_view(products, prefix=""):
+    return pd.DataFrame({
+        "Product Name": products["Product Name"],
+        "Sales": products[f"{prefix}Sales"],
+        "Quantity": products[f"{prefix}Quantity"],
+        "Discount": products[f"{prefix}Discount"] / products[f"{prefix}Transactions"],
+        "Profit": products[f"{prefix}Profit"],
+    })
+
+
+@profiled("aggregate")
+def top_10_products(context):
+    products = context.products
+    loss_products = product_view(products[products["Loss Transactions"] > 0], "Loss ")
+    _, top_loss_products = backend.top_k(loss_products, "Profit", 10)
+    top_loss_products = top_loss_products.reset_index(drop=True)
+
+    profitable_products = product_view(products[products["Gain Transactions"] > 0], "Gain ")
+    top_profitable_products, _ = backend.top_k(profitable_products, "Profit", 10)
+    top_profitable_products = top_profitable_products.reset_index(drop=True)
+
+    top_10_product_highest_discount, _ = backend.top_k(product_view(products), "Discount", 10)
+    top_10_product_highest_discount = top_10_product_highest_discount.reset_index(drop=True)
+    top_loss_products.index += 1
+    top_profitable_products.index += 1
+    top_10_product_highest_discount.index += 1
+
+    return top_loss_products, top_profitable_products, top_10_product_highest_discount
+
+
+@profiled("aggregate")
+def generate_metrics(filtered_cube, num_transactions=None):
+    if num_transactions is None:
+        num_transactions = filtered_cube["Transactions"].sum()
+    shipping_mode_counts_filtered = rollup(filtered_cube, "Ship Mode").set_index("Ship Mode")["Transactions"]
+    top_shipping_mode = shipping_mode_counts_filtered.idxmax()
+    ship_state_counts_filtered = rollup(filtered_cube, "State").set_index("State")["Transactions"]
+    top_shipping_state = ship_state_counts_filtered.idxmax()
+
+    metrics = {
+        "num_transactions": num_transactions,
+        "top_shipping_mode": top_shipping_mode,
+        "top_shipping_mode_count": int(shipping_mode_counts_filtered[top_shipping_mode]),
+        "top_shipping_state": top_shipping_state,
+        "top_shipping_state_count": int(ship_state_counts_filtered[top_shipping_state]),
+    }
+    return metrics
+
+
+@profiled("aggregate")
+def transaction_series(cube, cube_year):
+    # Transactions per year over the whole dataset and per month of the selected year
+    transactions_by_year = rollup(cube, "Year")[["Year", "Transactions"]]
+    transactions_by_month = rollup(cube_year, "Month")[["Month", "Transactions"]]
+    transactions_by_month["Month"] = transactions_by_month["Month"].map(MONTH_NAMES)
+    return transactions_by_year, transactions_by_month
+
+
+@profiled("aggregate")
+def generate_delivery_analysis(shipping_cells, shipping_sla_days=SHIPPING_SLA_DAYS):
+    # Cells carry a transaction count per shipping duration, so late counts and the
+    # average duration are weighted sums
+    shipping_duration = shipping_cells["Shipping Duration"].to_numpy()
+    transactions = shipping_cells["Transactions"].to_numpy()
+    estimated_duration = (
+        shipping_cells["Ship Mode"].map(shipping_sla_days).astype("float64").fillna(0)
+    )
+    deliveries = pd.DataFrame({
+        "Ship Mode": shipping_cells["Ship Mode"],
+        "Total Duration": shipping_duration * transactions,
+        "sum": np.where(shipping_duration > estimated_duration.to_numpy(), transactions, 0),
+        "count": transactions,
+    })
+    shipment_counts = backend.group_sum(
+        deliveries, "Ship Mode", ["Total Duration", "sum", "count"]
+    ).set_index("Ship Mode")
+    average_shipping_delay = (
+        (shipment_counts["Total Duration"] / shipment_counts["count"])
+        .rename("Average Shipping Duration (Days)")
+        .reset_index()
+    )
+
+    shipment_counts = shipment_counts[["sum", "count"]].copy()
+    shipment_counts["On Time Delivery"] = shipment_counts["count"] - shipment_counts["sum"]
+    shipment_counts["Late Delivery"] = shipment_counts["sum"]
+    shipment_counts = shipment_counts.reset_index()
+
+    return average_shipping_delay, shipment_counts
+
+
+@profiled("aggregate")
+def shipping_duration_percentiles(shipping_cells, percentiles=DURATION_PERCENTILES):
+    # The cells are per-day histograms of shipping durations, so summing them per ship mode
+    # and walking the cumulative counts gives exact percentiles (the shortest duration that
+    # covers that share of shipments) at a cost set by the number of cells, not rows
+    histogram = backend.group_sum(shipping_cells, ["Ship Mode", "Shipping Duration"], ["Transactions"])
+    histogram = histogram[histogram["Transactions"] > 0]
+    by_mode = histogram.groupby("Ship Mode", observed=True, sort=False)["Transactions"]
+    cumulative = by_mode.cumsum().to_numpy()
+    totals = by_mode.transform("sum").to_numpy()
+    result = {}
+    for percentile in percentiles:
+        covered = histogram[cumulative * 100 >= totals * percentile]
+        result[f"p{percentile} (Days)"] = (
+            covered.groupby("Ship Mode", observed=True)["Shipping Duration"].first()
+        )
+    return pd.DataFrame(result).rename_axis("Ship Mode").reset_index()
+
+
+@profiled("aggregate")
+def state_transaction_counts(filtered_cube):
+    # Most transactions first, ties by name
+    state_counts = backend.group_sum(filtered_cube, "State", ["Transactions"]).set_index("State")["Transactions"]
+    return state_counts[state_counts > 0].sort_values(ascending=False, kind="stable")
+
+
+@profiled("aggregate")
+def product_metrics(context, filtered_cube):
+    product_quantities = context.products[["Product Name", "Quantity"]]
+    top_product_by_quantity, _ = backend.top_k(product_quantities, "Quantity", 1)
+
+    return {
+        "total_products_sold": len(context.products),
+        "top_product_name": top_product_by_quantity.iloc[0]["Product Name"],
+        "top_product_quantity": top_product_by_quantity.iloc[0]["Quantity"],
+        "top_category": rollup(filtered_cube, "Category").set_index("Category")["Transactions"].idxmax(),
+    }
+
+
+def transaction_counts(filtered_cube, dimension):
+    # Most transactions first, ties by name
+    counts = backend.group_sum(filtered_cube, dimension, ["Transactions"]).set_index(dimension)["Transactions"]
+    return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+
+@profiled("aggregate")
+def top_bottom_10_products(context):
+    product_quantities = context.products[["Product Name", "Quantity"]]
+    top_10_products_by_quantity, bottom_10_products_by_quantity = backend.top_k(
+        product_quantities, "Quantity", 10
+    )
+    top_10_products_by_quantity = top_10_products_by_quantity.reset_index(drop=True)
+    top_10_products_by_quantity.index += 1
+
+    columns_to_display_product = ["Product Name", "Quantity"]
+
+    bottom_10_products_by_quantity = bottom_10_products_by_quantity.reset_index(drop=True)
+    bottom_10_products_by_quantity.index += 1
+
+    return top_10_products_by_quantity, bottom_10_products_by_quantity, columns_to_display_product
+
+
+@profiled("aggregate")
+def customer_metrics(context, filtered_reach=None):
+    customers = context.customers
+    customer_quantity = customers[["Customer Name", "Quantity"]]
+    top_customer_by_quantity, _ = backend.top_k(customer_quantity, "Quantity", 1)
+
+    customer_profit = customers[["Customer Name", "Profit"]]
+    top_customer_by_profit, _ = backend.top_k(customer_profit, "Profit", 1)
+
+    return {
+        "total_customers": len(customers) if filtered_reach is None else estimate_reach(filtered_reach),
+        "top_customer_name": top_customer_by_quantity.iloc[0]["Customer Name"],
+        "top_customer_quantity": top_customer_by_quantity.iloc[0]["Quantity"],
+        "top_customer_name_profit": top_customer_by_profit.iloc[0]["Customer Name"],
+        "top_customer_profit": top_customer_by_profit.iloc[0]["Profit"],
+    }
+
+
+@profiled("aggregate")
+def customer_counts(df, filtered_year):
+    # Distinct customers per year over all rows and per month of the selected year's rows
+    customer_counts_by_year = backend.group_nunique(df, "Year", "Customer Name")
+    customer_counts_by_month = backend.group_nunique(filtered_year, "Month", "Customer Name")
+    customer_counts_by_month["Month"] = customer_counts_by_month["Month"].map(MONTH_NAMES)
+    return customer_counts_by_year, customer_counts_by_month
+
+
+@profiled("aggregate")
+def estimated_customer_counts(reach, reach_year):
+    # customer_counts from the sketches over all cells and over the selected year's cells
+    customer_counts_by_year = estimate_reach(reach, "Year")
+    customer_counts_by_month = estimate_reach(reach_year, "Month")
+    customer_counts_by_month["Month"] = customer_counts_by_month["Month"].map(MONTH_NAMES)
+    return customer_counts_by_year, customer_counts_by_month
+
+
+@profiled("aggregate")
+def top_10_customer(context):
+    customers = context.customers
+
+    # Rank on the numeric totals first; product lists are only built for the winners
+    top_customers_quantity, _ = backend.top_k(customers, "Quantity", 10)
+    top_customers_quantity = top_customers_quantity.reset_index(drop=True)
+    top_customers_profit, _ = backend.top_k(customers, "Profit", 10)
+    top_customers_profit = top_customers_profit.reset_index(drop=True)
+
+    customer_products = context.customer_products(
+        set(top_customers_quantity["Customer Name"]) | set(top_customers_profit["Customer Name"])
+    )
+    top_customers_quantity["Product Name"] = top_customers_quantity["Customer Name"].map(customer_products).fillna("")
+    top_customers_profit["Product Name"] = top_customers_profit["Customer Name"].map(customer_products).fillna("")
+
+    top_customers_quantity.index += 1
+    top_customers_profit.index += 1
+
+    top_customers_quantity = top_customers_quantity[
+        ["Customer Name", "Product Name", "Quantity"]
+    ]
+    top_customers_profit = top_customers_profit[
+        ["Customer Name", "Product Name", "Profit"]
+    ]
+
+    return top_customers_profit, top_customers_quantity
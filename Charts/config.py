@@ -0,0 +1,64 @@
+import json
+import os
+
+CACHE_DIR = os.environ.get("SUPERSTORE_CACHE_DIR", ".cache")
+
+# Parse only rows appended to the source since the last load and fold them into the
+# cached dataset and aggregates, instead of rebuilding everything
+INCREMENTAL_INGEST = os.environ.get("SUPERSTORE_INCREMENTAL_INGEST", "1") != "0"
+
+# Expected days from order to shipment per Ship Mode; anything slower counts as late.
+# Override with a JSON object, e.g. SUPERSTORE_SHIPPING_SLA='{"Standard Class": 4}'
+SHIPPING_SLA_DAYS = {
+    "First Class": 2,
+    "Same Day": 0,
+    "Second Class": 3,
+    "Standard Class": 5,
+}
+SHIPPING_SLA_DAYS.update(json.loads(os.environ.get("SUPERSTORE_SHIPPING_SLA", "{}")))
+
+# Number of built figures and results kept across reruns before the least recently used is evicted
+FIGURE_CACHE_SIZE = int(os.environ.get("SUPERSTORE_FIGURE_CACHE_SIZE", "256"))
+
+# Build only the selected tab on each rerun instead of every tab behind st.tabs
+LAZY_TABS = os.environ.get("SUPERSTORE_LAZY_TABS", "1") != "0"
+
+# Distinct products listed per customer in the customer leaderboards before "(+N more)"
+CUSTOMER_PRODUCT_LIST_LENGTH = int(os.environ.get("SUPERSTORE_CUSTOMER_PRODUCT_LIST_LENGTH", "10"))
+
+# Build the dashboard from aggregates folded chunk by chunk from the source instead of
+# loading every row; for extracts that do not fit in memory
+STREAMING = os.environ.get("SUPERSTORE_STREAMING", "0") == "1"
+
+# Memory the streaming mode may use while parsing and aggregating one chunk, in MiB
+MEMORY_BUDGET_MB = int(os.environ.get("SUPERSTORE_MEMORY_BUDGET_MB", "512"))
+
+# Engine behind filters, group-bys and top-K selections: "pandas", "arrow" (pyarrow.compute)
+# or "duckdb" (in-process SQL)
+BACKEND = os.environ.get("SUPERSTORE_BACKEND", "pandas")
+
+# Serve the loaded rows with dictionary-encoded text, Arrow strings and narrowed numbers,
+# without the columns no chart reads; every session's copy of the frame shrinks with it
+COMPACT_DATASET = os.environ.get("SUPERSTORE_COMPACT_DATASET", "1") != "0"
+
+# Count customers with mergeable HyperLogLog sketches stored per cell (charts.sketches) instead
+# of distinct counts over rows: customer reach then comes from the cells for any filter, also in
+# streaming mode, within about 1.6% (one standard error) of the exact count
+REACH_SKETCH = os.environ.get("SUPERSTORE_REACH_SKETCH", "0") == "1"
+
+# Worker processes for full aggregate rebuilds run by python -m charts.prewarm; 0 or 1
+# builds in one process. The dashboard always builds in its own process and reads what
+# prewarm stored
+PARALLEL_WORKERS = int(os.environ.get("SUPERSTORE_PARALLEL_WORKERS", "0"))
+
+# Column the rows are split on for a parallel rebuild, one partition per value: "Year" or "Region"
+PARTITION_BY = os.environ.get("SUPERSTORE_PARTITION_BY", "Year")
+
+# Record wall time, rows and traced memory per load/filter/aggregate/figure/render span and
+# show them in a sidebar panel. Memory tracing slows every rerun, so keep it off in production
+PROFILING = os.environ.get("SUPERSTORE_PROFILING", "0") == "1"
+
+# Files the spans are exported to when profiling: JSON lines appended per rerun, and a
+# Prometheus text file with process-wide totals; empty to skip
+PROFILE_JSONL = os.environ.get("SUPERSTORE_PROFILE_JSONL", "")
+PROFILE_PROMETHEUS = os.environ.get("SUPERSTORE_PROFILE_PROMETHEUS", "")
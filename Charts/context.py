@@ -0,0 +1,100 @@
+import pandas as pd
+
+from charts.backend import backend
+from charts.config import CUSTOMER_PRODUCT_LIST_LENGTH
+from charts.dataset import widen
+from charts.figure_cache import figure_cache
+from charts.profiling import profiled
+
+SUMMARY_MEASURES = ["Sales", "Quantity", "Discount", "Profit"]
+# Builder name -> key of the matching table in the dataset-wide summaries
+SUMMARY_TABLES = {"product_summary": "products", "customer_summary": "customers"}
+
+
+@profiled("aggregate")
+def product_summary(filtered_df):
+    # One pass over the rows; loss/gain variants are masked copies of each measure
+    profit = filtered_df["Profit"]
+    loss = profit < 0
+    gain = profit > 0
+    columns = {"Product Name": filtered_df["Product Name"], "Transactions": 1}
+    for measure in SUMMARY_MEASURES:
+        values = widen(filtered_df[measure])
+        columns[measure] = values
+        columns[f"Loss {measure}"] = values.where(loss, 0)
+        columns[f"Gain {measure}"] = values.where(gain, 0)
+    columns["Loss Transactions"] = loss.astype("int64")
+    columns["Gain Transactions"] = gain.astype("int64")
+    return backend.group_sum(
+        pd.DataFrame(columns, index=filtered_df.index), "Product Name", list(columns)[1:]
+    )
+
+
+@profiled("aggregate")
+def customer_summary(filtered_df):
+    columns = {
+        "Customer Name": filtered_df["Customer Name"],
+        "Quantity": widen(filtered_df["Quantity"]),
+        "Profit": filtered_df["Profit"],
+        "Transactions": 1,
+    }
+    return backend.group_sum(
+        pd.DataFrame(columns, index=filtered_df.index), "Customer Name", list(columns)[1:]
+    )
+
+
+@profiled("aggregate")
+def customer_products(filtered_df, customer_names, max_products=CUSTOMER_PRODUCT_LIST_LENGTH):
+    # Only the rows of the requested customers are touched, and each list is built once.
+    # Products are listed in source order (the index), whatever order the rows are kept in
+    rows = filtered_df.loc[
+        filtered_df["Customer Name"].isin(customer_names), ["Customer Name", "Product Name"]
+    ].sort_index(kind="stable").drop_duplicates()
+    product_lists = {}
+    for customer_name, products in rows.groupby("Customer Name", observed=True, sort=False)["Product Name"]:
+        products = list(products)
+        product_list = ", ".join(products[:max_products])
+        if len(products) > max_products:
+            product_list += f" (+{len(products) - max_products} more)"
+        product_lists[customer_name] = product_list
+    return pd.Series(product_lists, dtype="object")
+
+
+# Per-filter summary tables shared by every Charts module. Each table is built at most once
+# per filter state and kept in the figure cache, so tabs and reruns reuse it. When the
+# filter keeps every row, the precomputed dataset-wide tables in summaries are used as is.
+# In streaming mode there are no rows (filtered_df is None) and summaries always answer.
+# year_df gives the selected year's rows, for the builders that need them: pass a function
+# that takes them, so a filter state served from the cache never copies them.
+class AggregationContext:
+    def __init__(self, filtered_df, filter_key, summaries=None, year_df=None):
+        self.filtered_df = filtered_df
+        self.filter_key = filter_key
+        self.summaries = summaries
+        self._year_df = year_df
+
+    @property
+    def year_df(self):
+        if callable(self._year_df):
+            self._year_df = self._year_df()
+        return self._year_df
+
+    def _summary(self, build, *args):
+        if self.summaries is not None and not args and build.__name__ in SUMMARY_TABLES:
+            return self.summaries[SUMMARY_TABLES[build.__name__]]
+        return figure_cache.get_or_build(
+            (build.__name__,) + args, self.filter_key, build, self.filtered_df, *args
+        )
+
+    @property
+    def products(self):
+        return self._summary(product_summary)
+
+    @property
+    def customers(self):
+        return self._summary(customer_summary)
+
+    def customer_products(self, customer_names, max_products=CUSTOMER_PRODUCT_LIST_LENGTH):
+        if self.filtered_df is None:
+            return pd.Series(dtype="object")
+        return self._summary(customer_products, tuple(sorted(customer_names)), max_products)
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from charts.backend import backend
+from charts.dataset import widen
+from charts.profiling import profiled
+
+CUBE_DIMENSIONS = [
+    "Year", "Month", "Region", "State", "City",
+    "Category", "Sub-Category", "Segment", "Ship Mode",
+]
+# Every measure is additive so any roll-up is just a sum over cells
+CUBE_MEASURES = [
+    "Sales", "Profit", "Loss", "Quantity",
+    "Transactions", "Discounted Transactions", "Discount",
+]
+
+# Shipping durations stay a dimension so late/on-time counts can be derived for any SLA
+SHIPPING_DIMENSIONS = [
+    "Year", "Month", "Region", "State", "City", "Ship Mode", "Shipping Duration",
+]
+
+
+def measure_columns(df):
+    profit = df["Profit"]
+    discount = widen(df["Discount"])
+    columns = {dimension: df[dimension] for dimension in CUBE_DIMENSIONS}
+    columns.update({
+        "Sales": df["Sales"],
+        "Profit": profit,
+        "Loss": profit.where(profit < 0, 0.0),
+        "Quantity": widen(df["Quantity"]),
+        "Transactions": 1,
+        "Discounted Transactions": (discount > 0).astype("int64"),
+        "Discount": discount,
+    })
+    return pd.DataFrame(columns, index=df.index)
+
+
+@profiled("aggregate")
+def build_cube(df):
+    return backend.group_sum(measure_columns(df), CUBE_DIMENSIONS, CUBE_MEASURES, sort=False)
+
+
+def shipping_columns(df):
+    columns = {dimension: df[dimension] for dimension in SHIPPING_DIMENSIONS}
+    columns["Transactions"] = 1
+    return pd.DataFrame(columns, index=df.index)
+
+
+@profiled("aggregate")
+def build_shipping_cube(df):
+    return backend.group_sum(shipping_columns(df), SHIPPING_DIMENSIONS, ["Transactions"], sort=False)
+
+
+@profiled("filter")
+def slice_cube(cube, year=None, month=None, region=None, state=None, city=None):
+    selection = {"Year": year, "Month": month, "Region": region, "State": state, "City": city}
+    return backend.filter(cube, selection)
+
+
+@profiled("aggregate")
+def rollup(cells, by):
+    return backend.group_sum(cells, by, CUBE_MEASURES)
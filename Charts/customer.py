@@ -2,55 +2,14 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 import streamlit as st
-
-def metric_calculations(filtered_df):
-    customer_quantity = (
-        filtered_df.groupby("Customer Name")["Quantity"].sum().reset_index()
-    )
-    top_customer_by_quantity = customer_quantity.sort_values(
-        by="Quantity", ascending=False
-    ).head(1)
-    top_customer_name = top_customer_by_quantity.iloc[0]["Customer Name"]
-    top_customer_quantity = top_customer_by_quantity.iloc[0]["Quantity"]
-
-    total_customer_sold = filtered_df["Customer Name"].value_counts()
-    total_customer_sold_len = len(total_customer_sold)
-
-    customer_profit = filtered_df.groupby("Customer Name")["Profit"].sum().reset_index()
-    top_customer_by_profit = customer_profit.sort_values(
-        by="Profit", ascending=False
-    ).head(1)
-    top_customer_name_profit = top_customer_by_profit.iloc[0]["Customer Name"]
-    top_customer_profit = top_customer_by_profit.iloc[0]["Profit"]
-    top_customer_profit_format = "{:,.0f}".format(top_customer_profit)
-
-    total_customer_sold = filtered_df["Customer Name"].value_counts()
-    total_customer_sold_len = len(total_customer_sold)
-    return total_customer_sold_len, top_customer_name, top_customer_quantity, top_customer_name_profit, top_customer_profit_format
-
-def customer_reach(df, filtered_year):
-    month_names = {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec"
-    }
-    customer_counts_by_year = (
-        df.groupby("Year")["Customer Name"].nunique().reset_index()
-    )
-    customer_counts_by_month = (
-        filtered_year.groupby("Month")["Customer Name"].nunique().reset_index()
-    )
-
-    customer_counts_by_month["Month"] = customer_counts_by_month["Month"].map(month_names)
+from charts.compute import customer_counts, customer_metrics, estimated_customer_counts, top_10_customer
+from charts.figure_cache import figure_cache, year_scope
+from charts.profiling import profiled
+from charts.sketches import STANDARD_ERROR
+
+@profiled("figure")
+def customer_reach(df, filtered_year, counts=customer_counts):
+    customer_counts_by_year, customer_counts_by_month = counts(df, filtered_year)
     fig = go.Figure()
     fig.add_trace(
         go.Scatter(
@@ -89,59 +48,71 @@ def customer_reach(df, filtered_year):
     )
     return fig, fig_month
 
-def top_10_customer(filtered_df):
-    top_customers_quantity = (
-        filtered_df.groupby(["Customer Name"])
-        .agg({"Quantity": "sum", "Product Name": lambda x: ", ".join(x)})
-        .nlargest(10, "Quantity")
-        .reset_index()
-    )
-
-    top_customers_profit = (
-        filtered_df.groupby(["Customer Name"])
-        .agg({"Profit": "sum", "Product Name": lambda x: ", ".join(x)})
-        .nlargest(10, "Profit")
-        .reset_index()
-    )
-
-    top_customers_quantity.index += 1
-    top_customers_profit.index += 1
-
-    top_customers_quantity = top_customers_quantity[
-        ["Customer Name", "Product Name", "Quantity"]
-    ]
-    top_customers_profit = top_customers_profit[
-        ["Customer Name", "Product Name", "Profit"]
-    ]
+def year_customer_reach(df, context):
+    return customer_reach(df, context.year_df)
+
+def customer_results(context, df, filtered_reach=None, reach=None, reach_year=None):
+    # With customer sketches (reach is not None) every count is an estimate from the cells
+    filter_key = context.filter_key
+    results = {
+        "metrics": figure_cache.get_or_build(
+            "customer_metrics", filter_key, customer_metrics, context, filtered_reach
+        ),
+        "top_10": figure_cache.get_or_build(
+            "top_10_customer", filter_key, top_10_customer, context
+        ),
+    }
+    if reach is not None:
+        results["reach"] = figure_cache.get_or_build(
+            "customer_reach", year_scope(filter_key), customer_reach,
+            reach, reach_year, estimated_customer_counts,
+        )
+    # Exact distinct customers cannot be summed across chunks, so streaming mode (df is None)
+    # skips the reach charts. The year's rows are only taken when the charts are built
+    elif df is not None:
+        results["reach"] = figure_cache.get_or_build(
+            "customer_reach", year_scope(filter_key), year_customer_reach, df, context
+        )
+    return results
 
-    return top_customers_profit, top_customers_quantity
-def display_customer(filtered_df,df, filtered_year):
-    total_customer_sold_len, top_customer_name, top_customer_quantity, top_customer_name_profit, top_customer_profit_format = metric_calculations(filtered_df)
-    fig, fig_month = customer_reach(df, filtered_year)
-    top_customers_profit, top_customers_quantity = top_10_customer(filtered_df)
+@profiled("render")
+def display_customer(context, df, filtered_reach=None, reach=None, reach_year=None):
+    results = customer_results(context, df, filtered_reach, reach, reach_year)
+    metrics = results["metrics"]
+    top_customers_profit, top_customers_quantity = results["top_10"]
     
     st.write("## Metric")
     metric1, metric2, metric3 = st.columns(3)
-    metric1.metric("Total Customer Reach", total_customer_sold_len)
+    reach_label, reach_help = "Total Customer Reach", None
+    if reach is not None:
+        reach_help = f"Estimated; within {2 * STANDARD_ERROR:.1%} for 95% of filters"
+    elif df is None:
+        # Streaming mode without sketches only has the customer totals over the whole dataset
+        reach_label = "Total Customer Reach (whole dataset)"
+        reach_help = "The sidebar filters do not apply to this count in streaming mode"
+    metric1.metric(reach_label, metrics["total_customers"], help=reach_help)
     metric2.metric(
-        "Top Customer by Quantity", f"{top_customer_name} ({top_customer_quantity})"
+        "Top Customer by Quantity",
+        f"{metrics['top_customer_name']} ({metrics['top_customer_quantity']})",
     )
     metric3.metric(
         "Top Customer by Profit",
-        f"{top_customer_name_profit} $({top_customer_profit_format})",
+        "{} $({:,.0f})".format(metrics["top_customer_name_profit"], metrics["top_customer_profit"]),
     )
 
-    view = st.radio(
-        "Select View", 
-        ("Yearly", "Monthly"),
-        key="customer_view"
-    )
-    if view == "Yearly":
-        st.subheader("Number of Customers Reached Each Year")
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.subheader("Sales and Profit by Month")
-        st.plotly_chart(fig_month, use_container_width=True)
+    if "reach" in results:
+        fig, fig_month = results["reach"]
+        view = st.radio(
+            "Select View", 
+            ("Yearly", "Monthly"),
+            key="customer_view"
+        )
+        if view == "Yearly":
+            st.subheader("Number of Customers Reached Each Year")
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.subheader("Sales and Profit by Month")
+            st.plotly_chart(fig_month, use_container_width=True)
 
     st.subheader("Top 10 Customers with Highest Quantity Sold")
     st.table(top_customers_quantity)
@@ -0,0 +1,227 @@
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from charts.config import CACHE_DIR, COMPACT_DATASET, INCREMENTAL_INGEST
+from charts.profiling import profiled
+
+# Bump whenever prepare() changes the typed layout so stale caches are rebuilt
+CACHE_VERSION = "3"
+STATE_PREFIX = "superstore."
+ENCODING = "ISO-8859-1"
+DATE_FORMAT = "%m/%d/%Y"
+CATEGORY_COLUMNS = ["Region", "State", "City", "Segment", "Category", "Ship Mode"]
+# Compact frames: columns no chart reads (Row ID stays in the cache for the append watermark)
+UNUSED_COLUMNS = ["Row ID", "Country", "Postal Code"]
+# Text columns with fewer distinct values than this share of rows are dictionary encoded,
+# the rest become Arrow strings
+CATEGORY_RATIO = 0.5
+DOWNCAST_COLUMNS = {"Quantity": "integer", "Year": "integer", "Month": "integer",
+                    "Shipping Duration": "integer", "Discount": "float"}
+# float32 holds six significant decimals, enough to restore the source's discount fractions
+FLOAT32_DECIMALS = 6
+# Bytes hashed at the start of the file and just before the ingested offset to tell
+# an append apart from a rewrite
+CHECK_BYTES = 64 * 1024
+
+
+def source_fingerprint(file_path):
+    stat = os.stat(file_path)
+    return f"{CACHE_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def prepare(raw):
+    raw["Order Date"] = pd.to_datetime(raw["Order Date"], format=DATE_FORMAT)
+    raw["Ship Date"] = pd.to_datetime(raw["Ship Date"], format=DATE_FORMAT)
+    raw["Year"] = raw["Order Date"].dt.year
+    raw["Month"] = raw["Order Date"].dt.month
+    raw["Shipping Duration"] = (raw["Ship Date"] - raw["Order Date"]).dt.days
+    for column in CATEGORY_COLUMNS:
+        raw[column] = raw[column].astype("category")
+    return raw
+
+
+def read_source(file_path, end=None):
+    if end is None or end >= os.path.getsize(file_path):
+        return prepare(pd.read_csv(file_path, encoding=ENCODING))
+    # Leave a partially written last line for the next load
+    with open(file_path, "rb") as source:
+        data = source.read(end)
+    return prepare(pd.read_csv(io.BytesIO(data), encoding=ENCODING))
+
+
+def compact_frame(df):
+    # Served read-only to the charts; the full frame is only needed to build aggregates
+    df = df.drop(columns=[column for column in UNUSED_COLUMNS if column in df.columns])
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object:
+            if values.nunique() < CATEGORY_RATIO * len(values):
+                df[column] = values.astype("category")
+            else:
+                df[column] = values.astype("string[pyarrow]")
+        elif column in DOWNCAST_COLUMNS:
+            df[column] = pd.to_numeric(values, downcast=DOWNCAST_COLUMNS[column])
+    return df
+
+
+def date_sorted(df):
+    # Stable, so rows of one day keep their source order; the index keeps each row's source
+    # position. Only the served frame is sorted: the cache stays in source order for appends
+    return df.take(np.argsort(df["Order Date"].to_numpy(), kind="stable"))
+
+
+def served_frame(df):
+    # The rows the charts filter: compact if enabled, in Order Date order
+    return date_sorted(compact_frame(df) if COMPACT_DATASET else df)
+
+
+def widen(values):
+    # Compact frames hold narrow measures; sums run at full width so totals match the source
+    if values.dtype == "float32":
+        return values.astype("float64").round(FLOAT32_DECIMALS)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.astype("int64")
+    return values
+
+
+def frame_memory(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def concat_frames(frames):
+    combined = pd.concat(frames, ignore_index=True)
+    # pd.concat falls back to object when category sets differ, so merge the dictionaries instead
+    for column in combined.columns:
+        if all(isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+            combined[column] = union_categoricals(
+                [frame[column] for frame in frames], ignore_order=True
+            )
+    return combined
+
+
+def complete_lines_offset(file_path):
+    # Offset just past the last newline; a partially written last line is read again next time
+    with open(file_path, "rb") as source:
+        position = source.seek(0, os.SEEK_END)
+        while position > 0:
+            step = min(CHECK_BYTES, position)
+            source.seek(position - step)
+            newline = source.read(step).rfind(b"\n")
+            if newline >= 0:
+                return position - step + newline + 1
+            position -= step
+    return 0
+
+
+def prefix_digest(file_path, offset):
+    with open(file_path, "rb") as source:
+        head = source.read(min(CHECK_BYTES, offset))
+        source.seek(max(0, offset - CHECK_BYTES))
+        tail = source.read(min(CHECK_BYTES, offset))
+    return hashlib.sha1(head + tail).hexdigest()
+
+
+def cache_path(file_path, name=None):
+    base = os.path.splitext(os.path.basename(file_path))[0]
+    if name is not None:
+        base = f"{base}.{name}"
+    return os.path.join(CACHE_DIR, f"{base}.parquet")
+
+
+def read_state(path):
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    prefix = STATE_PREFIX.encode()
+    return {
+        key[len(prefix):].decode(): value.decode()
+        for key, value in metadata.items()
+        if key.startswith(prefix)
+    }
+
+
+def write_cache(df, path, **state):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    for key, value in state.items():
+        metadata[f"{STATE_PREFIX}{key}".encode()] = str(value).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write to a temporary file first so concurrent sessions never read a half-written cache
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_cache(path):
+    return pq.read_table(path, memory_map=True).to_pandas()
+
+
+def is_append(file_path, state):
+    if state.get("version") != CACHE_VERSION:
+        return False
+    offset = int(state["offset"])
+    return os.path.getsize(file_path) >= offset and prefix_digest(file_path, offset) == state["prefix"]
+
+
+def read_appended_rows(file_path, offset, end, watermark):
+    columns = pd.read_csv(file_path, nrows=0, encoding=ENCODING).columns
+    with open(file_path, "rb") as source:
+        source.seek(offset)
+        data = source.read(end - offset)
+    if not data.strip():
+        return None
+    tail = pd.read_csv(io.BytesIO(data), header=None, names=columns, encoding=ENCODING)
+    tail = tail[tail["Row ID"] > watermark]
+    if tail.empty:
+        return None
+    return prepare(tail)
+
+
+@profiled("load")
+def load_dataset(file_path):
+    fingerprint = source_fingerprint(file_path)
+    path = cache_path(file_path)
+    state = read_state(path)
+    if state and state.get("fingerprint") == fingerprint:
+        return read_cache(path)
+
+    offset = complete_lines_offset(file_path)
+    if INCREMENTAL_INGEST and state and is_append(file_path, state):
+        # Only the complete lines after the last ingested one are parsed; rows already
+        # cached are skipped by the Row ID watermark
+        df = read_cache(path)
+        tail = read_appended_rows(
+            file_path, int(state["offset"]), offset, int(state["row_id_watermark"])
+        )
+        if tail is not None:
+            df = concat_frames([df, tail])
+        generation = state["generation"]
+    else:
+        df = read_source(file_path, offset)
+        generation = fingerprint
+
+    write_cache(
+        df,
+        path,
+        version=CACHE_VERSION,
+        fingerprint=fingerprint,
+        generation=generation,
+        offset=offset,
+        prefix=prefix_digest(file_path, offset),
+        row_id_watermark=int(df["Row ID"].max()),
+    )
+    return df
+
+
+def dataset_state(file_path):
+    return read_state(cache_path(file_path))
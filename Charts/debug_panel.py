@@ -0,0 +1,51 @@
+import pandas as pd
+import streamlit as st
+from charts.figure_cache import figure_cache
+from charts.profiling import STAGES, to_jsonl, to_prometheus
+
+def display_profile(trace, memory=None):
+    if trace is None:
+        return
+    spans = pd.DataFrame(trace["spans"])
+    with st.sidebar.expander("Profiling"):
+        st.write(f"Rerun: {trace['seconds'] * 1000:,.0f} ms")
+        if memory is not None:
+            st.write(
+                f"Dataset: {memory['served'] / 2**20:,.1f} MiB shared by all sessions "
+                f"({memory['read'] / 2**20:,.1f} MiB as read), "
+                f"summaries: {memory['summaries'] / 2**20:,.1f} MiB"
+            )
+        cache = figure_cache.stats()
+        lookups = cache["hits"] + cache["store_hits"] + cache["misses"]
+        if lookups:
+            # Pre-warm store hits are counted apart, so the panel shows what pre-warming saved
+            st.write(
+                f"Figure cache: {cache['hits']} hits, {cache['store_hits']} from the pre-warm store, "
+                f"{cache['misses']} built ({(cache['hits'] + cache['store_hits']) / lookups:.0%} served; "
+                f"{cache['size']}/{cache['max_size']} entries, {cache['stored']} stored)"
+            )
+        if spans.empty:
+            return
+
+        by_stage = (
+            spans.groupby("stage")["self_seconds"].sum().reindex(STAGES).dropna() * 1000
+        ).round(1).rename("Self ms")
+        st.table(by_stage)
+
+        st.dataframe(
+            pd.DataFrame({
+                "Span": ["  " * depth + name for depth, name in zip(spans["depth"], spans["name"])],
+                "Stage": spans["stage"],
+                "ms": (spans["seconds"] * 1000).round(1),
+                "Self ms": (spans["self_seconds"] * 1000).round(1),
+                "Rows in": spans["rows_in"],
+                "Rows out": spans["rows_out"],
+                "Memory KiB": (spans["memory_delta"] / 1024).round(1),
+            }),
+            hide_index=True,
+        )
+
+        st.download_button(
+            "Spans (JSON lines)", to_jsonl(trace), file_name=f"spans-{trace['run']}.jsonl"
+        )
+        st.download_button("Totals (Prometheus)", to_prometheus(), file_name="superstore.prom")
@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+from charts.config import FIGURE_CACHE_SIZE
+
+FilterKey = namedtuple(
+    "FilterKey",
+    ["dataset", "year", "month", "start_date", "end_date", "region", "state", "city"],
+)
+
+
+def _normalize(value):
+    if value is None or value == "All":
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _normalize_date(value):
+    # Streaming mode has no day-level range and passes None
+    if value is None:
+        return None
+    return pd.Timestamp(value).date().isoformat()
+
+
+def make_filter_key(dataset, year, month, start_date, end_date, region, state, city):
+    return FilterKey(
+        dataset=dataset,
+        year=_normalize(year),
+        month=_normalize(month),
+        start_date=_normalize_date(start_date),
+        end_date=_normalize_date(end_date),
+        region=_normalize(region),
+        state=_normalize(state),
+        city=_normalize(city),
+    )
+
+
+def dataset_scope(key):
+    # For builders that only look at the whole dataset
+    return FilterKey(key.dataset, None, None, None, None, None, None, None)
+
+
+def year_scope(key):
+    # For builders that only look at the whole dataset and the selected year
+    return FilterKey(key.dataset, key.year, None, None, None, None, None, None)
+
+
+class FigureCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        # Misses answered by the pre-warm store, and misses that had to be built
+        self.store_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Read-only results materialized ahead of time (see charts.prewarm), consulted on a miss
+        self._store = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, name, key, build, *args, **kwargs):
+        cache_key = (name, key)
+        with self._lock:
+            if cache_key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(cache_key)
+                return self._entries[cache_key]
+            store = self._store
+            if cache_key in store:
+                self.store_hits += 1
+            else:
+                self.misses += 1
+
+        value = store[cache_key] if cache_key in store else build(*args, **kwargs)
+
+        with self._lock:
+            self._entries[cache_key] = value
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def attach_store(self, entries):
+        with self._lock:
+            self._store = entries
+
+    def entries(self):
+        with self._lock:
+            return dict(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.store_hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "stored": len(self._store),
+            }
+
+
+# One cache per server process, shared by every session
+figure_cache = FigureCache(FIGURE_CACHE_SIZE)
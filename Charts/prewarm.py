@@ -0,0 +1,136 @@
+# Builds the dashboard's results for the filter states most sessions open with and stores
+# them on disk, so the first visitor after a deploy or a data refresh is served warm entries.
+#
+#   python -m charts.prewarm
+#
+# Covered: all years, every year, every year x month, and every region over all years, each
+# with the sidebar's default date range and no state or city. app.py attaches the store to
+# the figure cache at startup; results for any other filter state are built on demand as before.
+# Aggregates that need a full rebuild are built first, across SUPERSTORE_PARALLEL_WORKERS
+# processes (or --workers), and stored where the dashboard reads them.
+import argparse
+import os
+import pickle
+import time
+
+from charts.compute import load_data, select
+from charts.config import CACHE_DIR, PARALLEL_WORKERS, REACH_SKETCH, STREAMING
+from charts.customer import customer_results
+from charts.figure_cache import figure_cache
+from charts.product import product_results
+from charts.row_index import date_bounds, hierarchy_values, select_rows
+from charts.sales import SALES_FIGURES, sales_results, view_figure
+from charts.ship import shipping_results
+
+SOURCE = "Superstore.csv"
+SALES_VIEWS = ("Yearly", "Monthly")
+
+
+def store_path(file_path):
+    base = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(CACHE_DIR, f"{base}.results.pickle")
+
+
+def write_result_store(file_path, fingerprint, entries):
+    path = store_path(file_path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as target:
+        pickle.dump(
+            {
+                "fingerprint": fingerprint,
+                "streaming": STREAMING,
+                "reach_sketch": REACH_SKETCH,
+                "entries": entries,
+            },
+            target,
+            pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_result_store(file_path, fingerprint):
+    # Results from another version of the source or another mode, or an unreadable store,
+    # count as no store
+    try:
+        with open(store_path(file_path), "rb") as source:
+            stored = pickle.load(source)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return {}
+    if (
+        stored.get("fingerprint") != fingerprint
+        or stored.get("streaming") != STREAMING
+        or stored.get("reach_sketch") != REACH_SKETCH
+    ):
+        return {}
+    return stored["entries"]
+
+
+def combinations(row_index):
+    yield {}
+    for year in sorted(row_index["Year"]["values"]):
+        yield {"year": year}
+        for month in sorted(hierarchy_values(row_index, "Month", year=year)):
+            yield {"year": year, "month": month}
+    for region in hierarchy_values(row_index, "Region"):
+        yield {"region": region}
+
+
+def default_dates(data, selection):
+    # The sidebar's date input starts at the first and last order date of the year/month
+    # rows; streaming mode has no date range
+    if data["df"] is None:
+        return None, None
+    rows = select_rows(data["row_index"], year=selection.get("year"), month=selection.get("month"))
+    return date_bounds(data["row_index"], rows)
+
+
+def warm(data, selection):
+    start_date, end_date = default_dates(data, selection)
+    view = select(data, start_date=start_date, end_date=end_date, **selection)
+    if view["rows"] == 0:
+        return
+    cube = data["summaries"]["cube"]
+    context, filtered_cube, cube_year = view["context"], view["filtered_cube"], view["cube_year"]
+
+    shipping_results(context, filtered_cube, view["filtered_shipping"], cube, cube_year)
+    sales_results(context, filtered_cube)
+    for builder in SALES_FIGURES:
+        for sales_view in SALES_VIEWS:
+            view_figure(builder, sales_view, cube, cube_year, context.filter_key)
+    product_results(context, filtered_cube)
+    if view["filtered_reach"] is None:
+        customer_results(context, data["df"])
+    else:
+        customer_results(
+            context, None, view["filtered_reach"], data["summaries"]["reach"], view["reach_year"]
+        )
+
+
+def prewarm(file_path=SOURCE, workers=PARALLEL_WORKERS):
+    data = load_data(file_path, workers)
+    figure_cache.clear()
+    entries = {}
+    for selection in combinations(data["row_index"]):
+        warm(data, selection)
+        # Collected after every view, so the LRU never evicts a result before it is stored
+        entries.update(figure_cache.entries())
+    return write_result_store(file_path, data["name"], entries), entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the dashboard's common filter states")
+    parser.add_argument("--source", default=SOURCE)
+    parser.add_argument("--workers", type=int, default=PARALLEL_WORKERS)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    path, entries = prewarm(args.source, args.workers)
+    print(
+        f"{len(entries)} results in {time.perf_counter() - start:.1f}s, "
+        f"{os.path.getsize(path) / 2**20:.1f} MiB -> {path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
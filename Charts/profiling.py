@@ -0,0 +1,157 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from charts.config import PROFILE_JSONL, PROFILE_PROMETHEUS, PROFILING
+
+STAGES = ["load", "filter", "aggregate", "figure", "render"]
+
+# Each Streamlit session reruns the script in its own thread, so the running trace is per thread
+_local = threading.local()
+# Process-wide (stage, name) -> totals for the Prometheus export
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+def start_trace():
+    if not PROFILING:
+        return None
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _local.trace = {
+        "run": uuid.uuid4().hex,
+        "started": datetime.now(timezone.utc).isoformat(),
+        "start": time.perf_counter(),
+        "depth": 0,
+        "spans": [],
+    }
+    return _local.trace
+
+
+def finish_trace(trace):
+    if trace is None:
+        return None
+    _local.trace = None
+    trace["seconds"] = time.perf_counter() - trace.pop("start")
+    # Self time leaves out nested spans, so stage totals do not count the same work twice
+    open_spans = []
+    for record in trace["spans"]:
+        record["self_seconds"] = record["seconds"]
+        while open_spans and open_spans[-1]["depth"] >= record["depth"]:
+            open_spans.pop()
+        if open_spans:
+            open_spans[-1]["self_seconds"] -= record["seconds"]
+        open_spans.append(record)
+    with _totals_lock:
+        for record in trace["spans"]:
+            totals = _totals.setdefault(
+                (record["stage"], record["name"]), {"seconds": 0.0, "calls": 0, "last": record}
+            )
+            totals["seconds"] += record["seconds"]
+            totals["calls"] += 1
+            totals["last"] = record
+    if PROFILE_JSONL:
+        with open(PROFILE_JSONL, "a") as target:
+            target.write(to_jsonl(trace))
+    if PROFILE_PROMETHEUS:
+        # Written whole and swapped in, for node_exporter's textfile collector
+        tmp_path = f"{PROFILE_PROMETHEUS}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as target:
+            target.write(to_prometheus())
+        os.replace(tmp_path, PROFILE_PROMETHEUS)
+    return trace
+
+
+@contextmanager
+def span(stage, name, rows_in=None):
+    # Yields the span record; set record["rows_out"] inside the block when it is known
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield {}
+        return
+    # Recorded on entry so spans read top-down with their depth
+    record = {"stage": stage, "name": name, "depth": trace["depth"], "rows_in": rows_in, "rows_out": None}
+    trace["spans"].append(record)
+    trace["depth"] += 1
+    memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        record["memory_delta"] = tracemalloc.get_traced_memory()[0] - memory
+        trace["depth"] -= 1
+
+
+def row_count(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    filtered_df = getattr(value, "filtered_df", None)
+    if isinstance(filtered_df, pd.DataFrame):
+        return len(filtered_df)
+    return None
+
+
+def profiled(stage, name=None):
+    # Without the flag the function is returned untouched, so profiling costs nothing
+    def decorate(function):
+        if not PROFILING:
+            return function
+        label = name or f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            rows_in = next(
+                (rows for rows in map(row_count, [*args, *kwargs.values()]) if rows is not None), None
+            )
+            with span(stage, label, rows_in) as record:
+                result = function(*args, **kwargs)
+                record["rows_out"] = row_count(result)
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+def to_jsonl(trace):
+    lines = []
+    for record in trace["spans"]:
+        lines.append(json.dumps({"run": trace["run"], "started": trace["started"], **record}))
+    return "".join(f"{line}\n" for line in lines)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus():
+    with _totals_lock:
+        totals = sorted(_totals.items())
+    metrics = [
+        ("superstore_span_seconds_total", "counter", "Wall time spent in the span.",
+         lambda entry: entry["seconds"]),
+        ("superstore_span_calls_total", "counter", "Times the span ran.",
+         lambda entry: entry["calls"]),
+        ("superstore_span_last_seconds", "gauge", "Wall time of the latest run of the span.",
+         lambda entry: entry["last"]["seconds"]),
+        ("superstore_span_last_memory_delta_bytes", "gauge",
+         "Traced memory change over the latest run of the span.",
+         lambda entry: entry["last"]["memory_delta"]),
+    ]
+    lines = []
+    for metric, kind, help_text, value in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for (stage, name), entry in totals:
+            lines.append(f'{metric}{{stage="{_label(stage)}",name="{_label(name)}"}} {value(entry)}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+from charts.config import REACH_SKETCH
+from charts.profiling import profiled
+from charts.sketches import row_registers
+
+INDEX_DIMENSIONS = ["Year", "Month", "Region", "State", "City"]
+NO_ROWS = np.empty(0, dtype=np.int64)
+
+
+@profiled("load")
+def build_row_index(df):
+    # Aggregate cells can be indexed too; they have no Order Date and no date range filter
+    order_dates = df["Order Date"].to_numpy() if "Order Date" in df else None
+    index = {
+        "rows": len(df),
+        "Order Date": order_dates,
+        # Rows kept in Order Date order (dataset.date_sorted) turn every time filter into a
+        # binary search for one contiguous run of rows
+        "date_sorted": order_dates is not None and bool((order_dates[1:] >= order_dates[:-1]).all()),
+        # Each row's position in the source, which orders values by first appearance
+        "positions": df.index.to_numpy() if order_dates is not None else np.arange(len(df)),
+    }
+    for dimension in INDEX_DIMENSIONS:
+        codes, values = pd.factorize(df[dimension])
+        values = list(values)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.cumsum(np.bincount(codes, minlength=len(values)))[:-1]
+        index[dimension] = {
+            "codes": codes,
+            "values": values,
+            "postings": dict(zip(values, np.split(order, bounds))),
+        }
+    index["options"] = build_options(df, index["positions"])
+    if REACH_SKETCH and "Customer Name" in df:
+        # Each row's customer register and rank, for customer reach over a date range the
+        # sketch cells cannot answer
+        index["registers"] = row_registers(df)
+    return index
+
+
+def build_options(df, positions):
+    # The sidebar's dropdown values for every year/month selection (either may be "All"),
+    # each list in first-appearance order like present_values: Month, Region, State per
+    # region and City per (region, state), with None for "All"
+    frame = pd.DataFrame({dimension: df[dimension].to_numpy() for dimension in INDEX_DIMENSIONS})
+    frame = frame.take(np.argsort(positions, kind="stable")).drop_duplicates()
+    options = {}
+    for year, month, region, state, city in frame.itertuples(index=False):
+        for key in ((year, month), (year, None), (None, month), (None, None)):
+            entry = options.setdefault(key, {"Month": {}, "Region": {}, "State": {}, "City": {}})
+            entry["Month"].setdefault(None, {})[month] = None
+            entry["Region"].setdefault(None, {})[region] = None
+            for parent in (None, region):
+                entry["State"].setdefault(parent, {})[state] = None
+            for parent in ((None, None), (region, None), (None, state), (region, state)):
+                entry["City"].setdefault(parent, {})[city] = None
+    return {
+        key: {dimension: {parent: list(values) for parent, values in lists.items()}
+              for dimension, lists in entry.items()}
+        for key, entry in options.items()
+    }
+
+
+@profiled("filter")
+def select_rows(index, year=None, month=None, region=None, state=None, city=None, rows=None):
+    if index["date_sorted"] and year is not None:
+        if month is not None and not 1 <= month <= 12:
+            return NO_ROWS
+        try:
+            start = pd.Timestamp(year, month or 1, 1)
+            end = start + (pd.offsets.MonthBegin(1) if month else pd.offsets.YearBegin(1))
+            last = end - pd.Timedelta(days=1)
+        except ValueError:
+            # A year beyond what Timestamp holds: no row has it
+            return NO_ROWS
+        rows = date_run(index, rows, start, last)
+        year = month = None
+    selection = {"Year": year, "Month": month, "Region": region, "State": state, "City": city}
+    for dimension, value in selection.items():
+        if value is None:
+            continue
+        postings = index[dimension]["postings"].get(value, NO_ROWS)
+        rows = postings if rows is None else np.intersect1d(rows, postings, assume_unique=True)
+    return np.arange(index["rows"]) if rows is None else rows
+
+
+def column_date(order_dates, date, first, last):
+    # In the column's unit, and at most a day outside the days it holds: a far-off date parses
+    # in a coarser unit and would overflow when compared with the column's nanoseconds
+    day = pd.Timedelta(days=1)
+    date = min(max(pd.Timestamp(date), pd.Timestamp(first) - day), pd.Timestamp(last) + day)
+    return date.as_unit(np.datetime_data(order_dates.dtype)[0]).to_datetime64()
+
+
+def date_run(index, rows, start_date, end_date):
+    # Rows ordered by date on or between the two days, as a slice of rows (ascending, like
+    # every row selection) or a fresh range when rows is None
+    order_dates = index["Order Date"]
+    if len(order_dates) == 0:
+        return NO_ROWS
+    first, last = order_dates[0], order_dates[-1]
+    start = np.searchsorted(order_dates, column_date(order_dates, start_date, first, last), "left")
+    end = np.searchsorted(order_dates, column_date(order_dates, end_date, first, last), "right")
+    if rows is None:
+        return np.arange(start, end)
+    return rows[np.searchsorted(rows, start):np.searchsorted(rows, end)]
+
+
+@profiled("filter")
+def filter_date_range(index, rows, start_date, end_date):
+    if index["date_sorted"]:
+        return date_run(index, rows, start_date, end_date)
+    order_dates = index["Order Date"][rows]
+    if len(order_dates) == 0:
+        return rows
+    first, last = order_dates.min(), order_dates.max()
+    keep = (order_dates >= column_date(order_dates, start_date, first, last)) & (
+        order_dates <= column_date(order_dates, end_date, first, last)
+    )
+    return rows[keep]
+
+
+@profiled("filter")
+def date_bounds(index, rows):
+    if len(rows) == 0:
+        return pd.NaT, pd.NaT
+    if index["date_sorted"]:
+        return pd.Timestamp(index["Order Date"][rows[0]]), pd.Timestamp(index["Order Date"][rows[-1]])
+    order_dates = index["Order Date"][rows]
+    return pd.Timestamp(order_dates.min()), pd.Timestamp(order_dates.max())
+
+
+@profiled("filter")
+def present_values(index, dimension, rows):
+    entry = index[dimension]
+    # Order by first appearance in the source within the selected rows, like Series.unique()
+    # on the rows as read, whatever order they are kept in
+    unseen = np.iinfo(np.int64).max
+    first_seen = np.full(len(entry["values"]), unseen)
+    np.minimum.at(first_seen, entry["codes"][rows], index["positions"][rows])
+    codes = np.flatnonzero(first_seen != unseen)
+    return [entry["values"][code] for code in codes[np.argsort(first_seen[codes])]]
+
+
+@profiled("filter")
+def hierarchy_values(index, dimension, year=None, month=None, region=None, state=None, rows=None):
+    # Looked up in the options built with the index. A date range that cuts into the year or
+    # month passes its rows instead, which are narrowed and scanned: the options have no day grain
+    if rows is not None:
+        parents = {"State": {"region": region}, "City": {"region": region, "state": state}}
+        return present_values(index, dimension, select_rows(index, rows=rows, **parents.get(dimension, {})))
+    lists = index["options"].get((year, month), {}).get(dimension, {})
+    return list(lists.get({"State": region, "City": (region, state)}.get(dimension), []))
+
+
+@profiled("filter")
+def take_rows(df, rows):
+    # A contiguous run of rows (a time-only filter on a date-sorted frame) is sliced, not copied
+    if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+        return df.iloc[rows[0]:rows[-1] + 1]
+    return df.take(rows)
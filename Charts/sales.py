@@ -2,68 +2,32 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 import streamlit as st
+from charts.compute import calculate_metrics, range_metrics, sales_measures, top_10_products
+from charts.figure_cache import dataset_scope, figure_cache, year_scope
+from charts.profiling import profiled
 
-def calculate_metrics(filtered_df):
-    total_sales = round(filtered_df["Sales"].sum())
-    formatted_total_sales = "{:,.0f}".format(total_sales)
-    total_profit = round(filtered_df["Profit"].sum())
-    formatted_total_profit = "{:,.0f}".format(total_profit)
-
-    yearly_sales = filtered_df.groupby("Year")["Sales"].sum().reset_index()
-    yearly_profit = filtered_df.groupby("Year")["Profit"].sum().reset_index()
-    ratio_profit = pd.DataFrame()
-    ratio_profit["Year"] = yearly_profit["Year"]
-    ratio_profit["Rasio"] = (yearly_profit["Profit"] / yearly_sales["Sales"]) * 100
-    total_ratio_profit = round(ratio_profit["Rasio"].mean())
-
-    return {
-        "total_sales": formatted_total_sales,
-        "total_profit": formatted_total_profit,
-        "total_ratio_profit": total_ratio_profit,
-        "yearly_sales": yearly_sales,
-        "yearly_profit": yearly_profit,
-        "ratio_profit": ratio_profit,
-    }
-
-def plot_sales_profit(df, filtered_year):
-    month_names = {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec"
-    }
-    sales_profit_by_year = (
-        df.groupby("Year")
-        .agg({"Sales": "sum", "Profit": "sum"})
-        .reset_index()
-    )
+@profiled("figure")
+def plot_sales_profit(measures, grain):
+    sales_profit = measures
     fig = go.Figure()
     fig.add_trace(
         go.Scatter(
-            x=sales_profit_by_year["Year"],
-            y=sales_profit_by_year["Sales"],
+            x=sales_profit[grain],
+            y=sales_profit["Sales"],
             mode="lines+markers",
             name="Sales",
         )
     )
     fig.add_trace(
         go.Scatter(
-            x=sales_profit_by_year["Year"],
-            y=sales_profit_by_year["Profit"],
+            x=sales_profit[grain],
+            y=sales_profit["Profit"],
             mode="lines+markers",
             name="Profit",
         )
     )
     fig.update_layout(
-        xaxis_title="Year",
+        xaxis_title=grain,
         yaxis_title="Amount",
         width=1200,
         height=600,
@@ -71,239 +35,124 @@ def plot_sales_profit(df, filtered_year):
     )
     fig.update_xaxes(tickmode="linear")
 
+    return fig
 
-    sales_profit_by_month = (
-        filtered_year.groupby("Month")
-        .agg({"Sales": "sum", "Profit": "sum"})
-        .reset_index()
-    )
-
-    sales_profit_by_month["Month"] = sales_profit_by_month["Month"]
-    sales_profit_by_month["Month"] = sales_profit_by_month["Month"].map(month_names)
-    fig_month = go.Figure()
-    fig_month.add_trace(
-        go.Scatter(
-            x=sales_profit_by_month["Month"],
-            y=sales_profit_by_month["Sales"],
-            mode="lines+markers",
-            name="Sales",
-        )
-    )
-    fig_month.add_trace(
-        go.Scatter(
-            x=sales_profit_by_month["Month"],
-            y=sales_profit_by_month["Profit"],
-            mode="lines+markers",
-            name="Profit",
-        )
-    )
-    fig_month.update_layout(
-        xaxis_title="Month",
-        yaxis_title="Amount",
-        width=1200,
-        height=600,
-        legend=dict(x=0, y=1, traceorder="normal"),
-    )
-    fig_month.update_xaxes(tickmode="linear")
+@profiled("figure")
+def plot_loss(measures, grain):
+    negative_profit = measures.loc[measures["Loss"] < 0, [grain, "Loss"]]
+    negative_profit = negative_profit.rename(columns={"Loss": "Profit"})
+    negative_profit["Profit"] = negative_profit["Profit"].astype(int)
 
-    return fig, fig_month
+    total_negative_profit_rounded = round(measures["Loss"].sum(), 2)
+    if grain == "Year":
+        total_negative_profit_rounded = total_negative_profit_rounded * (-1)
+    format_loss = "{:,.0f}".format(total_negative_profit_rounded)
 
-def plot_loss_discount(filtered_df,df, filtered_year):
-    month_names = {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "May",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec"
-    }
-    negative_profit_data = df[df["Profit"] < 0]
-    negative_profit_by_year = negative_profit_data.groupby("Year")["Profit"].sum().reset_index()
-    negative_profit_by_year["Profit"] = negative_profit_by_year["Profit"].astype(int)
     fig = px.bar(
-            negative_profit_by_year,
-            x="Year",
+            negative_profit,
+            x=grain,
             y="Profit",
-            labels={"Year": "Year", "Profit": "Total Negative Profit"},
+            labels={grain: grain, "Profit": "Total Negative Profit"},
         )
     fig.update_layout(width=800)
-
     fig.update_xaxes(tickmode="linear")
+    if grain == "Year":
+        fig.update_layout(height=600)
 
-    negative_profit_data_month = filtered_year[filtered_year["Profit"] < 0]
-    negative_profit_by_month = negative_profit_data_month.groupby("Month")["Profit"].sum().reset_index()
-    negative_profit_by_month["Profit"] = negative_profit_by_month["Profit"].astype(int)
-    negative_profit_by_month["Month"] = negative_profit_by_month["Month"].map(month_names)
-
-    negative_profit_filtered_df = filtered_df[filtered_df["Profit"] < 0]
-
-    filter_negative_profit = negative_profit_filtered_df["Profit"].sum()
-    filter_negative_profit_rounded = round(filter_negative_profit, 2)
-    filter_negative_profit_rounded = filter_negative_profit_rounded * (-1)
-
-    total_negative_profit_df = df[df["Profit"] < 0]
-    total_negative_profit_ = total_negative_profit_df["Profit"].sum()
-    total_negative_profit_rounded = round(total_negative_profit_,2)
-
-    total_negative_profit_month = filtered_year[filtered_year["Profit"]<0]
-    total_negative_profit_month_ = total_negative_profit_month["Profit"].sum()
-    total_negative_profit_month_rounded = round(total_negative_profit_month_,2)
-    format_negative_profit_month = "{:,.0f}".format(total_negative_profit_month_rounded)
-    
-
-    fig_month = px.bar(
-            negative_profit_by_month,
-            x="Month",
-            y="Profit",
-            labels={"Month": "Month", "Profit": "Total Negative Profit"},
-        )
-    fig_month.update_layout(width=800)
-    fig_month.update_xaxes(tickmode="linear")
-
-    loss = total_negative_profit_rounded * (-1)
-    format_loss = "{:,.0f}".format(loss)
+    return fig, format_loss
 
-    discounted_transactions = df[df["Discount"]> 0]
-    discounted_transactions_by_year = (
-        discounted_transactions.groupby("Year")
-        .size()
-        .reset_index(name="Total Discounted Transactions")
-    )
-    average_discount = discounted_transactions["Discount"].mean()
-    average_discount_filter = filtered_df["Discount"].mean()
-    average_discount_year = filtered_year["Discount"].mean()
-
-    quantity_by_year = df.groupby("Year")["Quantity"].sum().reset_index()
-    quantity_by_month = filtered_year.groupby("Month")["Quantity"].sum().reset_index()
-    quantity_filter = filtered_df["Quantity"].sum()
-
-    discounted_transactions_month = filtered_year[filtered_year["Discount"]>0]
-
-    discounted_transactions_by_month = ( 
-        discounted_transactions_month.groupby("Month")
-        .size()
-        .reset_index(name = "Total Discounted Transactions")
-    )
-
-    discounted_transactions_by_month["Month"] = discounted_transactions_by_month["Month"].map(month_names)
-    quantity_by_month["Month"] = quantity_by_month["Month"].map(month_names)
+@profiled("figure")
+def plot_discounted_transactions(measures, grain):
+    discounted_transactions = measures.loc[
+        measures["Discounted Transactions"] > 0, [grain, "Discounted Transactions"]
+    ].rename(columns={"Discounted Transactions": "Total Discounted Transactions"})
 
-    fig_discount = px.bar(
-        discounted_transactions_by_year,
-        x="Year",
-        y="Total Discounted Transactions",
-        labels={"Year": "Year", "Total Discounted Transactions": "Total Discounted Transactions"},
-    )
-    fig_discount.update_layout(width=800)
-
-    fig_discount.update_xaxes(tickmode="linear")
+    if grain == "Year":
+        # Zero discounts add nothing to the sum, so this is the mean over discounted transactions
+        average_discount = measures["Discount"].sum() / measures["Discounted Transactions"].sum()
+    else:
+        average_discount = measures["Discount"].sum() / measures["Transactions"].sum()
 
-    fig_discount_month = px.bar(
-        discounted_transactions_by_month,
-        x="Month",
+    fig = px.bar(
+        discounted_transactions,
+        x=grain,
         y="Total Discounted Transactions",
-        labels={"Month": "Month", "Total Discounted Transactions": "Total Discounted Transactions"},
+        labels={grain: grain, "Total Discounted Transactions": "Total Discounted Transactions"},
     )
-    fig_discount_month.update_layout(width=800)
+    fig.update_layout(width=800)
+    fig.update_xaxes(tickmode="linear")
+    if grain == "Year":
+        fig.update_layout(height=600)
 
-    fig_discount_month.update_xaxes(tickmode="linear")
+    return fig, average_discount
 
-    fig_quantity = px.bar(
-        quantity_by_year,
-        x="Year",
-        y="Quantity",
-        labels={"Year": "Year", "Quantity": "Total Quantity Sold"},
-    )
+@profiled("figure")
+def plot_quantity(measures, grain):
+    quantity = measures[[grain, "Quantity"]]
 
-    fig_quantity_month = px.bar(
-        quantity_by_month,
-        x="Month",
+    fig = px.bar(
+        quantity,
+        x=grain,
         y="Quantity",
-        labels={"Month": "Month", "Quantity": "Total Quantity Sold"},
-    )
-
-    fig_height = 600
-    fig.update_layout(height=fig_height)
-    fig_discount.update_layout(height=fig_height)
-    fig_quantity.update_layout(height=fig_height)
-    fig_quantity.update_xaxes(tickmode="linear")
-    fig_quantity_month.update_layout(height=fig_height)
-    fig_quantity_month.update_xaxes(tickmode="linear")
-
-    return fig, format_loss, fig_discount, fig_quantity, average_discount, fig_month, filter_negative_profit_rounded, fig_discount_month, fig_quantity_month, average_discount_filter, quantity_filter, format_negative_profit_month, average_discount_year
-
-def display_top_10(filtered_df):
-    loss_products = filtered_df[filtered_df["Profit"] < 0]
-    top_loss_products = (
-        loss_products.groupby("Product Name")
-        .agg({"Sales": "sum", "Quantity": "sum", "Discount": "mean", "Profit": "sum"})
-        .reset_index()
-        .sort_values(by="Profit", ascending=True)
-        .head(10)
-        .reset_index(drop=True)
+        labels={grain: grain, "Quantity": "Total Quantity Sold"},
     )
+    fig.update_layout(height=600)
+    fig.update_xaxes(tickmode="linear")
 
-    profitable_products = filtered_df[filtered_df["Profit"] > 0]
-    top_profitable_products = (
-        profitable_products.groupby("Product Name")
-        .agg({"Sales": "sum", "Quantity": "sum", "Discount": "mean", "Profit": "sum"})
-        .reset_index()
-        .sort_values(by="Profit", ascending=False)
-        .head(10)
-        .reset_index(drop=True)
-    )
+    return fig
 
-    top_10_product_highest_discount = (
-        filtered_df.groupby("Product Name")
-        .agg({"Sales": "sum", "Quantity": "sum", "Discount": "mean", "Profit": "sum"})
-        .reset_index()
-        .sort_values(by="Discount", ascending=False)
-        .head(10)
-        .reset_index(drop=True)
-    )
-    top_loss_products.index += 1
-    top_profitable_products.index += 1
-    top_10_product_highest_discount.index += 1
-
-    return top_loss_products, top_profitable_products, top_10_product_highest_discount
+def view_figure(builder, view, cube, cube_year, filter_key):
+    # Only the selected view is built; the other one is built (and cached) once it is picked
+    if view == "Yearly":
+        cells, grain, scope = cube, "Year", dataset_scope(filter_key)
+    else:
+        cells, grain, scope = cube_year, "Month", year_scope(filter_key)
+    measures = figure_cache.get_or_build(("sales_measures", grain), scope, sales_measures, cells, grain)
+    return figure_cache.get_or_build((builder.__name__, view), scope, builder, measures, grain)
+
+# Built for both views ahead of time by the pre-warmer; the page builds the picked view only
+SALES_FIGURES = [plot_sales_profit, plot_loss, plot_discounted_transactions, plot_quantity]
+
+def sales_results(context, filtered_cube, daily=None, daily_range=None):
+    # With a daily_range the KPIs come from the prefix sums and filtered_cube may be None
+    filter_key = context.filter_key
+    if daily_range is None:
+        metrics = figure_cache.get_or_build("calculate_metrics", filter_key, calculate_metrics, filtered_cube)
+    else:
+        metrics = figure_cache.get_or_build("calculate_metrics", filter_key, range_metrics, daily, daily_range)
+    top_10 = figure_cache.get_or_build("top_10_products", filter_key, top_10_products, context)
+    return metrics, top_10
 
-def display_metrics_and_plots(filtered_df,df, filtered_year):
-    metrics = calculate_metrics(filtered_df)
-    fig_sales_profit, fig_sales_profit_month = plot_sales_profit(df,filtered_year)
-    fig, format_loss, fig_discount, fig_quantity, average_discount, fig_month, filter_negative_profit_rounded, fig_discount_month, fig_quantity_month, average_discount_filter, quantity_filter, format_negative_profit_month, average_discount_year  = plot_loss_discount(filtered_df,df, filtered_year)
-    top_loss_products, top_profitable_products, top_10_product_highest_discount = display_top_10(filtered_df)
+@profiled("render")
+def display_metrics_and_plots(context, filtered_cube, cube, cube_year, daily=None, daily_range=None):
+    filter_key = context.filter_key
+    metrics, top_10 = sales_results(context, filtered_cube, daily, daily_range)
+    top_loss_products, top_profitable_products, top_10_product_highest_discount = top_10
 
     st.subheader("Metric")
     metric1, metric2, metric3 = st.columns(3)
-    metric1.metric("Sales", f"${metrics['total_sales']}")
-    metric2.metric("Profit", f"${metrics['total_profit']}")
+    metric1.metric("Sales", "${:,.0f}".format(metrics["total_sales"]))
+    metric2.metric("Profit", "${:,.0f}".format(metrics["total_profit"]))
     metric3.metric("Profit Ratio", f"{metrics['total_ratio_profit']}%")
     metric_details1, metric_details2, metric_details3 = st.columns(3)
-    filter_negative_profit_rounded = "{:,.0f}".format(filter_negative_profit_rounded)
+    filter_negative_profit_rounded = "{:,.0f}".format(metrics["total_loss"])
     metric_details1.metric("Loss", f"-${filter_negative_profit_rounded}")
-    format_average_percent_filter = average_discount_filter * 100
+    format_average_percent_filter = metrics["average_discount"] * 100
     format_average_ = "{:.1f}".format(format_average_percent_filter)
     metric_details2.metric("Average Discount", f"{format_average_}%")
-    metric_details3.metric("Quantity Sold", quantity_filter)
+    metric_details3.metric("Quantity Sold", metrics["total_quantity"])
 
     view = st.radio(
         "Select View", 
         ("Yearly", "Monthly"),
         key="sales_profit_view"
     )
-    
+    fig_sales_profit = view_figure(plot_sales_profit, view, cube, cube_year, filter_key)
     if view == "Yearly":
         st.subheader("Sales and Profit by Year")
-        st.plotly_chart(fig_sales_profit, use_container_width=True)
     else:
         st.subheader("Sales and Profit by Month")
-        st.plotly_chart(fig_sales_profit_month, use_container_width=True)
+    st.plotly_chart(fig_sales_profit, use_container_width=True)
 
     loss1, loss2 = st.columns(2)
     with loss1:
@@ -312,44 +161,39 @@ def display_metrics_and_plots(filtered_df,df, filtered_year):
             ("Yearly", "Monthly"),
             key="sales_loss_view"
         )
+        fig, format_loss = view_figure(plot_loss, view, cube, cube_year, filter_key)
         if view =="Yearly":
             st.subheader(f"Loss by Year")
-            st.write("Total Loss: -$", format_loss)
-            st.plotly_chart(fig)
         else:
             st.subheader(f"Loss by Month")
-            st.write("Total Loss: -$", format_negative_profit_month)
-            st.plotly_chart(fig_month)
+        st.write("Total Loss: -$", format_loss)
+        st.plotly_chart(fig)
     with loss2:
         view = st.radio(
             "Select View", 
             ("Yearly", "Monthly"),
             key="discounted_transactions_view"
         )
-        if view =="Yearly":
-            st.subheader(f"Total Discounted Transactions")
-            format_average_percent = average_discount * 100
-            format_average = "{:.1f}".format(format_average_percent)
-            st.write("Average discount: ", format_average, "%")
-            st.plotly_chart(fig_discount)
-        else:
-            st.subheader(f"Total Discounted Transactions")
-            format_average_percent_filter_year = average_discount_year * 100
-            format_average_year = "{:.1f}".format(format_average_percent_filter_year)
-            st.write("Average discount: ", format_average_year, "%")
-            st.plotly_chart(fig_discount_month)
+        fig_discount, average_discount = view_figure(
+            plot_discounted_transactions, view, cube, cube_year, filter_key
+        )
+        st.subheader(f"Total Discounted Transactions")
+        format_average_percent = average_discount * 100
+        format_average = "{:.1f}".format(format_average_percent)
+        st.write("Average discount: ", format_average, "%")
+        st.plotly_chart(fig_discount)
 
     view = st.radio(
             "Select View", 
             ("Yearly", "Monthly"),
             key="quantity_transactions_view"
         )
+    fig_quantity = view_figure(plot_quantity, view, cube, cube_year, filter_key)
     if view == "Yearly":
         st.subheader("Total Quantity Sold by Year")
-        st.plotly_chart(fig_quantity, use_container_width=True)
     else:
         st.subheader("Total Quantity Sold by Month")
-        st.plotly_chart(fig_quantity_month, use_container_width=True)
+    st.plotly_chart(fig_quantity, use_container_width=True)
 
     st.subheader("Top 10 Products with Highest Loss:")
     st.table(top_loss_products)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from charts.backend import backend
+from charts.profiling import profiled
+
+# HyperLogLog sketches of the distinct customers per cube cell. A customer's 64-bit hash picks
+# one of REGISTERS registers with its top PRECISION bits, and the rest of the hash gives a
+# rank (position of the first set bit). A cell keeps the highest rank per register it has
+# seen, so it holds at most REGISTERS rows however many orders it covers. Sketches merge by
+# taking the highest rank per register, and any slice of cells rolls up the same way.
+PRECISION = 12
+REGISTERS = 2**PRECISION
+# Relative standard error of an estimate, about 1.6%: 95% of estimates are within twice that,
+# small counts included (the bundled file's 793 customers are estimated as 782, 1.4% low)
+STANDARD_ERROR = 1.04 / np.sqrt(REGISTERS)
+ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+SKETCH_DIMENSIONS = ["Year", "Month", "Region", "State", "City"]
+SKETCH_KEYS = SKETCH_DIMENSIONS + ["Register"]
+
+HASH_BITS = 64 - PRECISION
+
+
+def bit_length(values):
+    lengths = np.zeros(len(values), dtype="int64")
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >> np.uint64(shift)
+        wide = high > 0
+        lengths[wide] += shift
+        values = np.where(wide, high, values)
+    return lengths + (values > 0)
+
+
+def row_registers(df):
+    # Register and rank of every row's customer. Category, Arrow and object customer names
+    # hash alike, so any frame's sketch merges
+    hashes = pd.util.hash_pandas_object(df["Customer Name"], index=False).to_numpy()
+    registers = (hashes >> np.uint64(HASH_BITS)).astype("int16")
+    ranks = (HASH_BITS + 1 - bit_length(hashes & np.uint64(2**HASH_BITS - 1))).astype("int8")
+    return registers, ranks
+
+
+@profiled("aggregate")
+def build_reach_sketch(df):
+    columns = {dimension: df[dimension] for dimension in SKETCH_DIMENSIONS}
+    columns["Register"], columns["Rank"] = row_registers(df)
+    return backend.group_max(pd.DataFrame(columns, index=df.index), SKETCH_KEYS, ["Rank"], sort=False)
+
+
+@profiled("aggregate")
+def rows_sketch(registers, rows):
+    # One sketch over some rows, from the registers and ranks row_registers gave for every
+    # row; for filters the cells cannot answer (a date range that cuts into them)
+    row_register, row_rank = registers
+    highest = np.zeros(REGISTERS, dtype="int8")
+    np.maximum.at(highest, row_register[rows], row_rank[rows])
+    filled = np.flatnonzero(highest)
+    return pd.DataFrame({"Register": filled.astype("int16"), "Rank": highest[filled]})
+
+
+def cardinality(filled, inverse_sum):
+    empty = REGISTERS - filled
+    raw = ALPHA * REGISTERS**2 / (inverse_sum + empty)
+    linear = REGISTERS * np.log(REGISTERS / np.maximum(empty, 1))
+    return np.rint(np.where((raw <= 2.5 * REGISTERS) & (empty > 0), linear, raw)).astype("int64")
+
+
+@profiled("aggregate")
+def estimate_reach(sketch, grain=None):
+    # Approximate distinct customers over all cells (of a slice), or per value of grain as a
+    # frame shaped like backend.group_nunique(rows, grain, "Customer Name")
+    keys = [grain, "Register"] if grain else ["Register"]
+    registers = sketch.groupby(keys, observed=True, sort=False)["Rank"].max().reset_index()
+    registers["Inverse"] = np.ldexp(1.0, -registers["Rank"].to_numpy().astype("int64"))
+    if grain is None:
+        return int(cardinality(len(registers), registers["Inverse"].sum()))
+    per_value = registers.groupby(grain, observed=True).agg(
+        Filled=("Register", "size"), Inverse=("Inverse", "sum")
+    )
+    return pd.DataFrame({
+        grain: per_value.index,
+        "Customer Name": cardinality(per_value["Filled"].to_numpy(), per_value["Inverse"].to_numpy()),
+    })
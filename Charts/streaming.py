@@ -0,0 +1,71 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+from charts.aggregates import build_aggregates, merge_aggregates, read_aggregates, write_aggregates
+from charts.config import MEMORY_BUDGET_MB
+from charts.dataset import ENCODING, frame_memory, prepare, source_fingerprint
+from charts.profiling import profiled
+
+# Rows parsed up front to measure how much memory one typed row takes
+SAMPLE_ROWS = 1000
+# A chunk is held as parsed rows, as measure columns and as group-by state at the same time
+CHUNK_COPIES = 4
+# Share of the budget the chunks' partial aggregates may take while they wait to be merged.
+# The running aggregates are grouped again once per batch of chunks rather than per chunk
+PENDING_SHARE = 0.25
+
+
+def iter_source(file_path, chunk_rows):
+    # Parquet sources are read one row-group batch at a time, CSV sources in row chunks
+    if file_path.endswith(".parquet"):
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows):
+            yield prepare(batch.to_pandas())
+    else:
+        for chunk in pd.read_csv(file_path, encoding=ENCODING, chunksize=chunk_rows):
+            yield prepare(chunk)
+
+
+def chunk_rows_for_budget(file_path, memory_budget_mb=MEMORY_BUDGET_MB):
+    sample = next(iter_source(file_path, SAMPLE_ROWS))
+    row_bytes = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    return max(SAMPLE_ROWS, int(memory_budget_mb * 2**20 / (row_bytes * CHUNK_COPIES)))
+
+
+def aggregates_memory(aggregates):
+    return sum(frame_memory(table) for table in aggregates.values())
+
+
+def merge_pending(aggregates, pending):
+    parts = pending if aggregates is None else [aggregates] + pending
+    return parts[0] if len(parts) == 1 else merge_aggregates(parts)
+
+
+@profiled("load")
+def stream_aggregates(file_path, memory_budget_mb=MEMORY_BUDGET_MB):
+    # Only one chunk, the running aggregates and the partials not yet merged into them are in
+    # memory at any time
+    aggregates = None
+    pending, pending_bytes = [], 0
+    watermark = 0
+    for chunk in iter_source(file_path, chunk_rows_for_budget(file_path, memory_budget_mb)):
+        partial = build_aggregates(chunk)
+        pending.append(partial)
+        pending_bytes += aggregates_memory(partial)
+        watermark = max(watermark, int(chunk["Row ID"].max()))
+        if pending_bytes > PENDING_SHARE * memory_budget_mb * 2**20:
+            aggregates = merge_pending(aggregates, pending)
+            pending, pending_bytes = [], 0
+    if pending:
+        aggregates = merge_pending(aggregates, pending)
+    return aggregates, watermark
+
+
+def load_streamed_aggregates(file_path, memory_budget_mb=MEMORY_BUDGET_MB):
+    fingerprint = source_fingerprint(file_path)
+    stored, _ = read_aggregates(file_path, fingerprint)
+    if stored is not None:
+        return stored
+
+    aggregates, watermark = stream_aggregates(file_path, memory_budget_mb)
+    write_aggregates(file_path, aggregates, fingerprint, watermark)
+    return aggregates
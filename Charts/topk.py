@@ -0,0 +1,22 @@
+import numpy as np
+
+
+def top_bottom_k(table, column, k=10):
+    # Partial selection instead of a full sort: np.partition places both cut-off values in
+    # one O(n) pass, then only the rows on the right side of each cut-off get sorted.
+    # Ties keep table order, and rows where the column is NaN are never selected.
+    values = table[column].to_numpy(dtype="float64")
+    positions = np.flatnonzero(~np.isnan(values))
+    values = values[positions]
+    n = len(values)
+
+    if n > 2 * k:
+        low, high = np.partition(values, [k - 1, n - k])[[k - 1, n - k]]
+        bottom = np.flatnonzero(values <= low)
+        top = np.flatnonzero(values >= high)
+    else:
+        bottom = top = np.arange(n)
+
+    bottom = bottom[np.lexsort((bottom, values[bottom]))][:k]
+    top = top[np.lexsort((top, -values[top]))][:k]
+    return table.iloc[positions[top]], table.iloc[positions[bottom]]
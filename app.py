@@ -7,15 +7,87 @@ from charts.sales import display_metrics_and_plots
 from charts.ship import display_all_shippings
 from charts.product import display_all_product
 from charts.customer import display_customer
+from charts.config import LAZY_TABS, PROFILING, REACH_SKETCH, STREAMING
+from charts.aggregates import load_aggregates
+from charts.context import AggregationContext
+from charts.dataset import frame_memory, load_dataset, served_frame, source_fingerprint
+from charts.cube import measure_columns, shipping_columns, slice_cube
+from charts.figure_cache import figure_cache, make_filter_key
+from charts.row_index import build_row_index, date_bounds, filter_date_range, hierarchy_values, select_rows, take_rows
+from charts.streaming import load_streamed_aggregates
+from charts.profiling import finish_trace, profiled, span, start_trace
+from charts.debug_panel import display_profile
+from charts.prewarm import read_result_store
+from charts.compute import range_for_prefix
+from charts.prefix_sums import build_daily_prefix
+from charts.sketches import rows_sketch
 
 st.set_page_config(layout="wide", initial_sidebar_state="expanded")
+trace = start_trace()
 
+# Shared by every session rather than unpickled per rerun: the charts only read the frame
+@st.cache_resource
+def load_data(file_path, fingerprint):
+    return served_frame(load_dataset(file_path))
+
+# Cube and per-product/per-customer totals over the whole dataset; after an append
+# only the new rows are aggregated and merged into the stored tables. Built from the
+# full cached rows, which keep the Row ID watermark the compact frame drops. Shared like the frame
+@st.cache_resource
+def load_summaries(file_path, fingerprint):
+    return load_aggregates(file_path, load_dataset(file_path))
+
+# Size of the loaded rows as read and as served, and of the summaries, for the profiling panel
 @st.cache_data
-def load_data(file_path):
-    return pd.read_csv(file_path, encoding="ISO-8859-1")
+def load_memory_report(file_path, fingerprint):
+    df = load_dataset(file_path)
+    return {
+        "read": frame_memory(df),
+        "served": frame_memory(load_data(file_path, fingerprint)),
+        "summaries": sum(frame_memory(table) for table in load_summaries(file_path, fingerprint).values()),
+    }
+
+# Shared rather than copied per rerun: the index is read-only integer arrays
+@st.cache_resource
+def load_row_index(file_path, fingerprint):
+    return build_row_index(load_data(file_path, fingerprint))
+
+# Daily running totals of the cube measures, for date-range KPIs; shared like the row index
+@st.cache_resource
+def load_daily_prefix(file_path, fingerprint):
+    return build_daily_prefix(load_data(file_path, fingerprint))
+
+# Streaming mode never holds the rows: aggregates are folded chunk by chunk from the source
+@st.cache_resource
+def load_streamed_summaries(file_path, fingerprint):
+    return load_streamed_aggregates(file_path)
+
+# The sidebar filters run on an index over the cube cells instead of the rows
+@st.cache_resource
+def load_cell_index(file_path, fingerprint):
+    return build_row_index(load_streamed_summaries(file_path, fingerprint)["cube"])
+
+# Results materialized by `python -m charts.prewarm` for this version of the source, if any
+@st.cache_resource
+def load_result_store(file_path, fingerprint):
+    return read_result_store(file_path, fingerprint)
 
 file_path = "Superstore.csv"
-df = load_data(file_path)
+fingerprint = source_fingerprint(file_path)
+figure_cache.attach_store(load_result_store(file_path, fingerprint))
+# Cache hits take this span too, so a warm rerun shows what the loaders cost
+with span("load", "app.load_cached") as record:
+    if STREAMING:
+        df = daily = None
+        summaries = load_streamed_summaries(file_path, fingerprint)
+        row_index = load_cell_index(file_path, fingerprint)
+    else:
+        df = load_data(file_path, fingerprint)
+        summaries = load_summaries(file_path, fingerprint)
+        row_index = load_row_index(file_path, fingerprint)
+        daily = load_daily_prefix(file_path, fingerprint)
+    record["rows_out"] = len(summaries["cube"]) if STREAMING else len(df)
+cube = summaries["cube"]
 
 def apply_custom_css():
     with open("style.css") as f:
@@ -27,18 +99,9 @@ st.sidebar.image("superstore_logo.png", width=300)
 
 st.sidebar.markdown('<div style="margin-top: 50px;"></div>', unsafe_allow_html=True)
 
-shipping, sales, product, customer = st.tabs(
-    ["Shipping", "Sales", "Product", "Customer"]
-)
-
-df["Order Date"] = pd.to_datetime(df["Order Date"], format="%m/%d/%Y")
-df["Ship Date"] = pd.to_datetime(df["Ship Date"], format="%m/%d/%Y")
-df["Year"] = df["Order Date"].dt.year
-df["Month"] = df["Order Date"].dt.month
-
-latest_year = df["Year"].max()
-latest_month = df[df["Year"] == latest_year]["Month"].max()
-latest_date = df["Order Date"].max()
+year_values = sorted(row_index["Year"]["values"])
+latest_year = year_values[-1]
+latest_month = max(hierarchy_values(row_index, "Month", year=latest_year))
 first_date_latest_month = pd.Timestamp(latest_year, latest_month, 1)
 last_date_latest_month = first_date_latest_month + pd.offsets.MonthEnd(1)
 
@@ -53,119 +116,189 @@ month_numbers = {v: k for k, v in month_names.items()}
 
 year_filter = st.sidebar.selectbox(
     "Filter by Year",
-    ["All"] + sorted(df["Year"].unique()),
-    index=sorted(df["Year"].unique()).index(latest_year) + 1 if latest_year else 0
+    ["All"] + year_values,
+    index=year_values.index(latest_year) + 1 if latest_year else 0
 )
 
-if year_filter == "All":
-    filtered_year = df
-    available_months = sorted(filtered_year["Month"].unique())
-    month_filter_options = ["All"] + [month_names[m] for m in available_months]
-    if latest_month in available_months:
-        month_filter_index = available_months.index(latest_month) + 1
-    else:
-        month_filter_index = 0
-    month_filter = st.sidebar.selectbox(
-        "Filter by Month",
-        month_filter_options,
-        index=month_filter_index
-    )
+selected_year = None if year_filter == "All" else year_filter
+year_rows = select_rows(row_index, year=selected_year)
 
+available_months = sorted(hierarchy_values(row_index, "Month", year=selected_year))
+month_filter_options = ["All"] + [month_names[m] for m in available_months]
+if latest_month in available_months:
+    month_filter_index = available_months.index(latest_month) + 1
 else:
-    filtered_year = df[df["Year"] == year_filter]
-    available_months = sorted(filtered_year["Month"].unique())
-    month_filter_options = ["All"] + [month_names[m] for m in available_months]
-    if latest_month in available_months:
-        month_filter_index = available_months.index(latest_month) + 1
-    else:
-        month_filter_index = 0
-    
-    month_filter = st.sidebar.selectbox(
-        "Filter by Month",
-        month_filter_options,
-        index=month_filter_index
-    )
+    month_filter_index = 0
+
+month_filter = st.sidebar.selectbox(
+    "Filter by Month",
+    month_filter_options,
+    index=month_filter_index
+)
 
 if month_filter != "All":
     selected_month_number = month_numbers[month_filter]
 else:
     selected_month_number = None
 
-if selected_month_number is not None:
-    filtered_data = filtered_year[filtered_year["Month"] == selected_month_number]
-else:
-    filtered_data = filtered_year
+month_rows = select_rows(row_index, year=selected_year, month=selected_month_number)
 
-min_date = filtered_data["Order Date"].min()
-max_date = filtered_data["Order Date"].max()
-first_date_latest_month = pd.Timestamp(latest_year, latest_month, 1)
-latest_date = max_date
-default_date_range = [first_date_latest_month, last_date_latest_month]
-
-if year_filter == latest_year and month_filter == latest_month:
-    date_range = st.sidebar.date_input(
-        "Filter by Date Range",
-        default_date_range,
-        min_value=first_date_latest_month,
-        max_value=last_date_latest_month,
-    )
-    
+if STREAMING:
+    # The aggregates stop at month grain, so there is no day-level range to pick
+    start_date = end_date = None
+    date_rows = month_rows
 else:
-    date_range = st.sidebar.date_input(
-        "Filter by Date Range",
-        [min_date, latest_date],
-        min_value=min_date,
-        max_value=max_date,
-    )
+    min_date, max_date = date_bounds(row_index, month_rows)
+    latest_date = max_date
+    default_date_range = [first_date_latest_month, last_date_latest_month]
 
-if len(date_range) == 2:
-    start_date, end_date = date_range
-    filtered_data = filtered_data[
-        (filtered_data["Order Date"] >= pd.to_datetime(start_date))
-        & (filtered_data["Order Date"] <= pd.to_datetime(end_date))
-    ]
-else:
-    start_date = end_date = date_range[0]
-    filtered_data = filtered_data[
-        (filtered_data["Order Date"] >= pd.to_datetime(start_date))
-        & (filtered_data["Order Date"] <= pd.to_datetime(end_date))
-    ]
+    if year_filter == latest_year and month_filter == latest_month:
+        date_range = st.sidebar.date_input(
+            "Filter by Date Range",
+            default_date_range,
+            min_value=first_date_latest_month,
+            max_value=last_date_latest_month,
+        )
+    
+    else:
+        date_range = st.sidebar.date_input(
+            "Filter by Date Range",
+            [min_date, latest_date],
+            min_value=min_date,
+            max_value=max_date,
+        )
 
+    # A single picked date is a one-day range
+    start_date, end_date = date_range[0], date_range[-1]
+    date_rows = filter_date_range(row_index, month_rows, start_date, end_date)
 
-list_of_regions = ["All"] + list(filtered_data["Region"].unique())
+# The dropdowns are looked up per year/month; only a date range that cuts into it scans rows
+partial_rows = None if len(date_rows) == len(month_rows) else date_rows
+cascade = dict(year=selected_year, month=selected_month_number, rows=partial_rows)
 
+list_of_regions = ["All"] + hierarchy_values(row_index, "Region", **cascade)
 selected_region = st.sidebar.selectbox("Select Region", list_of_regions)
-if selected_region == "All":
-    filtered_region = filtered_data
-else:
-    filtered_region = filtered_data[filtered_data["Region"] == selected_region]
+selected_region = None if selected_region == "All" else selected_region
 
-list_of_states = ["All"] + list(filtered_region["State"].unique())
-selected_state = st.sidebar.selectbox("Select State", list_of_states)
+region_rows = select_rows(row_index, region=selected_region, rows=date_rows)
 
-if selected_state == "All":
-    filtered_state = filtered_region
-else:
-    filtered_state = filtered_region[filtered_region["State"] == selected_state]
+list_of_states = ["All"] + hierarchy_values(row_index, "State", region=selected_region, **cascade)
+selected_state = st.sidebar.selectbox("Select State", list_of_states)
+selected_state = None if selected_state == "All" else selected_state
 
-list_of_cities = ["All"] + list(filtered_state["City"].unique())
+list_of_cities = ["All"] + hierarchy_values(
+    row_index, "City", region=selected_region, state=selected_state, **cascade
+)
 selected_city = st.sidebar.selectbox("Select City", list_of_cities)
+selected_city = None if selected_city == "All" else selected_city
 
-if selected_city == "All":
-    filtered_df = filtered_state
-else:
-    filtered_df = filtered_state[filtered_state["City"] == selected_city]
+filtered_rows = select_rows(row_index, state=selected_state, city=selected_city, rows=region_rows)
+with span("filter", "app.take_rows", len(filtered_rows)) as record:
+    filtered_df = None if STREAMING else take_rows(df, filtered_rows)
+    record["rows_out"] = None if STREAMING else len(filtered_df)
+
+cube_year = slice_cube(cube, year=selected_year)
+whole_range = STREAMING or (pd.Timestamp(start_date) <= min_date and pd.Timestamp(end_date) >= max_date)
+
+# A date range that cuts into the year or month gets its KPIs from the daily prefix sums
+daily_range = None if STREAMING else range_for_prefix(
+    row_index, date_rows, whole_range,
+    selected_year, selected_month_number, selected_region, selected_state, selected_city,
+)
+
+@profiled("filter")
+def load_filtered_cells(cells, columns):
+    # The cubes have no day grain, so they can only answer when the date range keeps every row
+    if whole_range:
+        return slice_cube(
+            cells,
+            year=selected_year,
+            month=selected_month_number,
+            region=selected_region,
+            state=selected_state,
+            city=selected_city,
+        )
+    # Row-level columns are valid cells too, and skip grouping by every cube dimension
+    return columns(filtered_df)
+
+def load_filtered_cube():
+    return load_filtered_cells(cube, measure_columns)
+
+def load_filtered_shipping():
+    return load_filtered_cells(summaries["shipping"], shipping_columns)
+
+def load_filtered_reach():
+    # A date range that cuts into the cells uses every row's register, taken with the row index
+    return load_filtered_cells(
+        summaries["reach"], lambda rows_df: rows_sketch(row_index["registers"], filtered_rows)
+    )
+
+filter_key = make_filter_key(
+    fingerprint, selected_year, selected_month_number, start_date, end_date,
+    selected_region, selected_state, selected_city,
+)
+
+# An unfiltered selection is answered by the stored dataset-wide summaries
+context = AggregationContext(
+    filtered_df, filter_key, summaries if STREAMING or len(filtered_rows) == len(df) else None,
+    None if STREAMING else lambda: take_rows(df, year_rows),
+)
 
 st.sidebar.markdown('<div style="margin-top: 200px;"></div>', unsafe_allow_html=True)
 st.sidebar.markdown(
     "<h3 style='text-align: center;'>Maleakhi Ezekiel</h3>", unsafe_allow_html=True
 )
+if STREAMING:
+    st.sidebar.caption(
+        "Streaming mode: product and customer rankings "
+        + ("cover the whole dataset; date range is not available." if REACH_SKETCH else
+           "and the customer count cover the whole dataset; date range and the customer reach "
+           "charts are not available.")
+    )
+
+def show_shipping():
+    display_all_shippings(
+        context, load_filtered_cube(), load_filtered_shipping(), cube, cube_year, daily, daily_range
+    )
+
+def show_sales():
+    # The sales tab only reads the filtered cells for its KPIs
+    filtered_cube = load_filtered_cube() if daily_range is None else None
+    display_metrics_and_plots(context, filtered_cube, cube, cube_year, daily, daily_range)
+
+def show_product():
+    display_all_product(context, load_filtered_cube())
+
+def show_customer():
+    if REACH_SKETCH:
+        # Customer counts come from the sketches, so the rows are not needed for them
+        reach = summaries["reach"]
+        display_customer(context, None, load_filtered_reach(), reach, slice_cube(reach, year=selected_year))
+    else:
+        display_customer(context, df)
+
+tab_pages = {
+    "Shipping": show_shipping,
+    "Sales": show_sales,
+    "Product": show_product,
+    "Customer": show_customer,
+}
+
+if LAZY_TABS:
+    # st.tabs runs every tab and only hides the output, so only the selected page is built here.
+    # Widgets on pages that are not rendered lose their state, so keep the Yearly/Monthly choices alive.
+    for key in list(st.session_state.keys()):
+        if key.endswith("_view"):
+            st.session_state[key] = st.session_state[key]
+    active_tab = st.radio(
+        "Tab", list(tab_pages), horizontal=True, key="active_tab", label_visibility="collapsed"
+    )
+    tab_pages[active_tab]()
+else:
+    for tab, show_page in zip(st.tabs(list(tab_pages)), tab_pages.values()):
+        with tab:
+            show_page()
 
-with shipping:
-    display_all_shippings(filtered_df,df, filtered_year)
-with sales:
-    display_metrics_and_plots(filtered_df,df, filtered_year)
-with product:
-    display_all_product(filtered_df)
-with customer:
-    display_customer(filtered_df,df, filtered_year)
+if PROFILING:
+    memory = None if STREAMING else load_memory_report(file_path, fingerprint)
+    display_profile(finish_trace(trace), memory)
@@ -0,0 +1,306 @@
+# The compute paths benchmarks.run times, as they were before any optimization: copies of
+# the original app.py sidebar and Charts functions with the Streamlit calls left out. They
+# run on the frame the original app loaded (read_csv plus the date columns), so the report
+# can put before and after side by side. Do not optimize these.
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from charts.dataset import ENCODING
+from charts.ship import STATE_ABBREV, STATE_COORDS
+
+MONTH_NAMES = {
+    1: "Jan", 2: "Feb", 3: "Mar", 4: "Apr", 5: "May", 6: "Jun",
+    7: "Jul", 8: "Aug", 9: "Sep", 10: "Oct", 11: "Nov", 12: "Dec",
+}
+
+
+def load_data(file_path):
+    df = pd.read_csv(file_path, encoding=ENCODING)
+    df["Order Date"] = pd.to_datetime(df["Order Date"], format="%m/%d/%Y")
+    df["Ship Date"] = pd.to_datetime(df["Ship Date"], format="%m/%d/%Y")
+    df["Year"] = df["Order Date"].dt.year
+    df["Month"] = df["Order Date"].dt.month
+    return df
+
+
+def filter_cascade(df, year=None, month=None, start_date=None, end_date=None,
+                   region=None, state=None, city=None):
+    # The original sidebar: every selectbox lists the unique values of the rows left so far
+    filtered_year = df if year is None else df[df["Year"] == year]
+    sorted(filtered_year["Month"].unique())
+    filtered_data = filtered_year if month is None else filtered_year[filtered_year["Month"] == month]
+    min_date = filtered_data["Order Date"].min()
+    max_date = filtered_data["Order Date"].max()
+    start_date = min_date if start_date is None else start_date
+    end_date = max_date if end_date is None else end_date
+    filtered_data = filtered_data[
+        (filtered_data["Order Date"] >= pd.to_datetime(start_date))
+        & (filtered_data["Order Date"] <= pd.to_datetime(end_date))
+    ]
+    list(filtered_data["Region"].unique())
+    filtered_region = filtered_data if region is None else filtered_data[filtered_data["Region"] == region]
+    list(filtered_region["State"].unique())
+    filtered_state = filtered_region if state is None else filtered_region[filtered_region["State"] == state]
+    list(filtered_state["City"].unique())
+    filtered_df = filtered_state if city is None else filtered_state[filtered_state["City"] == city]
+    return {"filtered_df": filtered_df, "filtered_year": filtered_year}
+
+
+def calculate_metrics(filtered_df):
+    total_sales = round(filtered_df["Sales"].sum())
+    formatted_total_sales = "{:,.0f}".format(total_sales)
+    total_profit = round(filtered_df["Profit"].sum())
+    formatted_total_profit = "{:,.0f}".format(total_profit)
+
+    yearly_sales = filtered_df.groupby("Year")["Sales"].sum().reset_index()
+    yearly_profit = filtered_df.groupby("Year")["Profit"].sum().reset_index()
+    ratio_profit = pd.DataFrame()
+    ratio_profit["Year"] = yearly_profit["Year"]
+    ratio_profit["Rasio"] = (yearly_profit["Profit"] / yearly_sales["Sales"]) * 100
+    total_ratio_profit = round(ratio_profit["Rasio"].mean())
+
+    return {
+        "total_sales": formatted_total_sales,
+        "total_profit": formatted_total_profit,
+        "total_ratio_profit": total_ratio_profit,
+        "yearly_sales": yearly_sales,
+        "yearly_profit": yearly_profit,
+        "ratio_profit": ratio_profit,
+    }
+
+
+def plot_loss_discount(filtered_df, df, filtered_year):
+    negative_profit_data = df[df["Profit"] < 0]
+    negative_profit_by_year = negative_profit_data.groupby("Year")["Profit"].sum().reset_index()
+    negative_profit_by_year["Profit"] = negative_profit_by_year["Profit"].astype(int)
+    fig = px.bar(
+        negative_profit_by_year,
+        x="Year",
+        y="Profit",
+        labels={"Year": "Year", "Profit": "Total Negative Profit"},
+    )
+    fig.update_layout(width=800)
+    fig.update_xaxes(tickmode="linear")
+
+    negative_profit_data_month = filtered_year[filtered_year["Profit"] < 0]
+    negative_profit_by_month = negative_profit_data_month.groupby("Month")["Profit"].sum().reset_index()
+    negative_profit_by_month["Profit"] = negative_profit_by_month["Profit"].astype(int)
+    negative_profit_by_month["Month"] = negative_profit_by_month["Month"].map(MONTH_NAMES)
+
+    negative_profit_filtered_df = filtered_df[filtered_df["Profit"] < 0]
+    filter_negative_profit = negative_profit_filtered_df["Profit"].sum()
+    filter_negative_profit_rounded = round(filter_negative_profit, 2)
+    filter_negative_profit_rounded = filter_negative_profit_rounded * (-1)
+
+    total_negative_profit_df = df[df["Profit"] < 0]
+    total_negative_profit_ = total_negative_profit_df["Profit"].sum()
+    total_negative_profit_rounded = round(total_negative_profit_, 2)
+
+    total_negative_profit_month = filtered_year[filtered_year["Profit"] < 0]
+    total_negative_profit_month_ = total_negative_profit_month["Profit"].sum()
+    total_negative_profit_month_rounded = round(total_negative_profit_month_, 2)
+    format_negative_profit_month = "{:,.0f}".format(total_negative_profit_month_rounded)
+
+    fig_month = px.bar(
+        negative_profit_by_month,
+        x="Month",
+        y="Profit",
+        labels={"Month": "Month", "Profit": "Total Negative Profit"},
+    )
+    fig_month.update_layout(width=800)
+    fig_month.update_xaxes(tickmode="linear")
+
+    loss = total_negative_profit_rounded * (-1)
+    format_loss = "{:,.0f}".format(loss)
+
+    discounted_transactions = df[df["Discount"] > 0]
+    discounted_transactions_by_year = (
+        discounted_transactions.groupby("Year")
+        .size()
+        .reset_index(name="Total Discounted Transactions")
+    )
+    average_discount = discounted_transactions["Discount"].mean()
+    average_discount_filter = filtered_df["Discount"].mean()
+    average_discount_year = filtered_year["Discount"].mean()
+
+    quantity_by_year = df.groupby("Year")["Quantity"].sum().reset_index()
+    quantity_by_month = filtered_year.groupby("Month")["Quantity"].sum().reset_index()
+    quantity_filter = filtered_df["Quantity"].sum()
+
+    discounted_transactions_month = filtered_year[filtered_year["Discount"] > 0]
+    discounted_transactions_by_month = (
+        discounted_transactions_month.groupby("Month")
+        .size()
+        .reset_index(name="Total Discounted Transactions")
+    )
+    discounted_transactions_by_month["Month"] = discounted_transactions_by_month["Month"].map(MONTH_NAMES)
+    quantity_by_month["Month"] = quantity_by_month["Month"].map(MONTH_NAMES)
+
+    fig_discount = px.bar(
+        discounted_transactions_by_year,
+        x="Year",
+        y="Total Discounted Transactions",
+        labels={"Year": "Year", "Total Discounted Transactions": "Total Discounted Transactions"},
+    )
+    fig_discount.update_layout(width=800)
+    fig_discount.update_xaxes(tickmode="linear")
+
+    fig_discount_month = px.bar(
+        discounted_transactions_by_month,
+        x="Month",
+        y="Total Discounted Transactions",
+        labels={"Month": "Month", "Total Discounted Transactions": "Total Discounted Transactions"},
+    )
+    fig_discount_month.update_layout(width=800)
+    fig_discount_month.update_xaxes(tickmode="linear")
+
+    fig_quantity = px.bar(
+        quantity_by_year,
+        x="Year",
+        y="Quantity",
+        labels={"Year": "Year", "Quantity": "Total Quantity Sold"},
+    )
+    fig_quantity_month = px.bar(
+        quantity_by_month,
+        x="Month",
+        y="Quantity",
+        labels={"Month": "Month", "Quantity": "Total Quantity Sold"},
+    )
+
+    fig_height = 600
+    fig.update_layout(height=fig_height)
+    fig_discount.update_layout(height=fig_height)
+    fig_quantity.update_layout(height=fig_height)
+    fig_quantity.update_xaxes(tickmode="linear")
+    fig_quantity_month.update_layout(height=fig_height)
+    fig_quantity_month.update_xaxes(tickmode="linear")
+
+    return (
+        fig, format_loss, fig_discount, fig_quantity, average_discount, fig_month,
+        filter_negative_profit_rounded, fig_discount_month, fig_quantity_month,
+        average_discount_filter, quantity_filter, format_negative_profit_month, average_discount_year,
+    )
+
+
+def display_top_10(filtered_df):
+    loss_products = filtered_df[filtered_df["Profit"] < 0]
+    top_loss_products = (
+        loss_products.groupby("Product Name")
+        .agg({"Sales": "sum", "Quantity": "sum", "Discount": "mean", "Profit": "sum"})
+        .reset_index()
+        .sort_values(by="Profit", ascending=True)
+        .head(10)
+        .reset_index(drop=True)
+    )
+
+    profitable_products = filtered_df[filtered_df["Profit"] > 0]
+    top_profitable_products = (
+        profitable_products.groupby("Product Name")
+        .agg({"Sales": "sum", "Quantity": "sum", "Discount": "mean", "Profit": "sum"})
+        .reset_index()
+        .sort_values(by="Profit", ascending=False)
+        .head(10)
+        .reset_index(drop=True)
+    )
+
+    top_10_product_highest_discount = (
+        filtered_df.groupby("Product Name")
+        .agg({"Sales": "sum", "Quantity": "sum", "Discount": "mean", "Profit": "sum"})
+        .reset_index()
+        .sort_values(by="Discount", ascending=False)
+        .head(10)
+        .reset_index(drop=True)
+    )
+    top_loss_products.index += 1
+    top_profitable_products.index += 1
+    top_10_product_highest_discount.index += 1
+
+    return top_loss_products, top_profitable_products, top_10_product_highest_discount
+
+
+def generate_delivery_analysis(filtered_df):
+    # Adds columns to its argument, as the original did
+    filtered_df["Order Date"] = pd.to_datetime(filtered_df["Order Date"], format="%m/%d/%Y")
+    filtered_df["Ship Date"] = pd.to_datetime(filtered_df["Ship Date"], format="%m/%d/%Y")
+    filtered_df["Shipping Duration"] = (filtered_df["Ship Date"] - filtered_df["Order Date"]).dt.days
+
+    average_shipping_delay = filtered_df.groupby("Ship Mode")["Shipping Duration"].mean().reset_index()
+    average_shipping_delay.rename(columns={"Shipping Duration": "Average Shipping Duration (Days)"}, inplace=True)
+
+    average_estimated_duration = {
+        "First Class": 2,
+        "Same Day": 0,
+        "Second Class": 3,
+        "Standard Class": 5,
+    }
+
+    def is_late(row):
+        return row["Shipping Duration"] > average_estimated_duration.get(row["Ship Mode"], 0)
+
+    filtered_df["Late Shipment"] = filtered_df.apply(is_late, axis=1)
+    shipment_counts = filtered_df.groupby("Ship Mode")["Late Shipment"].agg(["sum", "count"])
+    shipment_counts["On Time Delivery"] = shipment_counts["count"] - shipment_counts["sum"]
+    shipment_counts["Late Delivery"] = shipment_counts["sum"]
+    shipment_counts = shipment_counts.reset_index()
+
+    return average_shipping_delay, shipment_counts
+
+
+def generate_shipping_state_map(filtered_df):
+    state_counts = filtered_df["State"].value_counts().reset_index()
+    state_counts.columns = ["State", "Count"]
+    state_counts["State"] = state_counts["State"].apply(lambda x: STATE_ABBREV.get(x, x)).str.upper()
+
+    coords_df = pd.DataFrame.from_dict(STATE_COORDS, orient="index", columns=["Latitude", "Longitude"]).reset_index()
+    coords_df.columns = ["State", "Latitude", "Longitude"]
+    state_counts = pd.merge(state_counts, coords_df, on="State", how="left")
+
+    fig = px.choropleth(
+        state_counts,
+        locations="State",
+        locationmode="USA-states",
+        color="Count",
+        scope="usa",
+        color_continuous_scale="Blues",
+    )
+    for i, row in state_counts.iterrows():
+        fig.add_trace(
+            go.Scattergeo(
+                locationmode="USA-states",
+                lon=[row["Longitude"]],
+                lat=[row["Latitude"]],
+                text=row["State"],
+                mode="text",
+                showlegend=False,
+            )
+        )
+    fig.update_layout(
+        width=1800,
+        height=800,
+        geo=dict(
+            lakecolor="rgb(255, 255, 255)",
+            projection_type="albers usa",
+        ),
+    )
+    return fig
+
+
+def top_10_customer(filtered_df):
+    top_customers_quantity = (
+        filtered_df.groupby(["Customer Name"])
+        .agg({"Quantity": "sum", "Product Name": lambda x: ", ".join(x)})
+        .nlargest(10, "Quantity")
+        .reset_index()
+    )
+    top_customers_profit = (
+        filtered_df.groupby(["Customer Name"])
+        .agg({"Profit": "sum", "Product Name": lambda x: ", ".join(x)})
+        .nlargest(10, "Profit")
+        .reset_index()
+    )
+    top_customers_quantity.index += 1
+    top_customers_profit.index += 1
+    top_customers_quantity = top_customers_quantity[["Customer Name", "Product Name", "Quantity"]]
+    top_customers_profit = top_customers_profit[["Customer Name", "Product Name", "Profit"]]
+    return top_customers_profit, top_customers_quantity
@@ -0,0 +1,225 @@
+# Seeded synthetic Superstore data for benchmarks.
+#
+#   python -m benchmarks.generate 1m            -> benchmarks/data/superstore_1m_seed0.csv
+#   python -m benchmarks.generate 10k 10m --seed 7
+#
+# Customers, products and cities are drawn from the bundled Superstore.csv and extended with
+# synthetic variants as the row count grows (square root for customers and products, fourth
+# root for cities; the 49 states stay fixed). Popularity is skewed so leaderboards have clear
+# winners, and quantity/discount/margin and ship-mode/delay pairs are resampled from the
+# bundled rows so loss, discount and delivery charts keep their shape.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+SOURCE = "Superstore.csv"
+ENCODING = "ISO-8859-1"
+DATA_DIR = os.path.join("benchmarks", "data")
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+COLUMNS = [
+    "Row ID", "Order ID", "Order Date", "Ship Date", "Ship Mode", "Customer ID",
+    "Customer Name", "Segment", "Country", "City", "State", "Postal Code", "Region",
+    "Product ID", "Category", "Sub-Category", "Product Name", "Sales", "Quantity",
+    "Discount", "Profit",
+]
+FIRST_DAY = pd.Timestamp("2014-01-01")
+DAYS = (pd.Timestamp("2017-12-31") - FIRST_DAY).days + 1
+CITY_SUFFIXES = ["Heights", "Park", "Falls", "Springs", "Valley", "Harbor", "Ridge", "Grove"]
+# Orders are generated and written in chunks of about this many rows
+CHUNK_ROWS = 500_000
+
+
+def parse_size(size):
+    if size in SIZES:
+        return SIZES[size]
+    return int(size)
+
+
+def data_path(size, seed, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f"superstore_{size}_seed{seed}.csv")
+
+
+def popularity(rng, count, skew=0.8):
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def customer_pool(rng, base, count):
+    customers = base[["Customer ID", "Customer Name", "Segment"]].drop_duplicates("Customer ID")
+    extra = count - len(customers)
+    if extra <= 0:
+        return customers.reset_index(drop=True)
+    names = customers["Customer Name"].str.split(" ", n=1, expand=True).fillna("")
+    first_names = names[0].unique()
+    last_names = names[1].unique()
+    # New customers recombine first and last names from the bundled file
+    pairs = rng.choice(len(first_names) * len(last_names), size=extra, replace=False)
+    first = first_names[pairs // len(last_names)]
+    last = last_names[pairs % len(last_names)]
+    numbers = np.arange(len(customers), len(customers) + extra)
+    synthetic = pd.DataFrame({
+        "Customer ID": [f"{f[:1]}{l[:1]}-{n:06d}" for f, l, n in zip(first, last, numbers)],
+        "Customer Name": [f"{f} {l}".strip() for f, l in zip(first, last)],
+        "Segment": rng.choice(customers["Segment"].to_numpy(), size=extra),
+    })
+    return pd.concat([customers, synthetic], ignore_index=True)
+
+
+def product_pool(rng, base, count):
+    unit_price = base["Sales"] / (base["Quantity"] * (1 - base["Discount"]))
+    products = (
+        base.assign(**{"Unit Price": unit_price})
+        .groupby(["Product ID", "Category", "Sub-Category", "Product Name"], sort=False)["Unit Price"]
+        .mean()
+        .reset_index()
+    )
+    extra = count - len(products)
+    if extra <= 0:
+        return products
+    # New products are numbered variants of existing ones at a nearby price
+    source = products.iloc[rng.integers(0, len(products), size=extra)].reset_index(drop=True)
+    variants = np.arange(extra) // len(products) + 2
+    source["Product ID"] = source["Product ID"] + "-" + pd.Series(variants).astype(str)
+    source["Product Name"] = source["Product Name"] + " v" + pd.Series(variants).astype(str)
+    source["Unit Price"] = source["Unit Price"] * rng.lognormal(0, 0.2, size=extra)
+    return pd.concat([products, source], ignore_index=True)
+
+
+def geo_pool(rng, base, count):
+    places = base[["City", "State", "Region", "Postal Code"]].drop_duplicates("Postal Code")
+    extra = count - len(places)
+    if extra <= 0:
+        return places.reset_index(drop=True)
+    source = places.iloc[rng.integers(0, len(places), size=extra)].reset_index(drop=True)
+    suffixes = np.array(CITY_SUFFIXES)[np.arange(extra) % len(CITY_SUFFIXES)]
+    rounds = np.arange(extra) // len(CITY_SUFFIXES)
+    source["City"] = [
+        f"{city} {suffix}" + (f" {n + 1}" if n else "")
+        for city, suffix, n in zip(source["City"], suffixes, rounds)
+    ]
+    source["Postal Code"] = 100000 + np.arange(extra)
+    return pd.concat([places, source], ignore_index=True)
+
+
+def order_dates(days):
+    return pd.DatetimeIndex(FIRST_DAY + pd.to_timedelta(days, unit="D"))
+
+
+def format_dates(dates):
+    return (
+        pd.Series(dates.month).astype(str) + "/"
+        + pd.Series(dates.day).astype(str) + "/"
+        + pd.Series(dates.year).astype(str)
+    )
+
+
+def pick(rng, pool, size):
+    frame, weights = pool
+    return frame.iloc[rng.choice(len(frame), size=size, p=weights)].reset_index(drop=True)
+
+
+def generate_chunk(rng, base, pools, first_row, first_order, rows):
+    # Orders have one or more lines (two on average, like the bundled data)
+    lines_per_order = rng.geometric(0.5, size=rows)
+    orders = int(np.searchsorted(np.cumsum(lines_per_order), rows) + 1)
+    line_order = np.repeat(np.arange(orders), lines_per_order[:orders])[:rows]
+
+    # Order-level attributes; later days get more orders, like the growth in the bundled data
+    day_weights = np.linspace(1, 1.7, DAYS)
+    days = rng.choice(DAYS, size=orders, p=day_weights / day_weights.sum())[line_order]
+    shipping = base[["Ship Mode", "Shipping Days"]].iloc[rng.integers(0, len(base), size=orders)]
+    customer = pick(rng, pools["customers"], orders).iloc[line_order].reset_index(drop=True)
+    place = pick(rng, pools["geo"], orders).iloc[line_order].reset_index(drop=True)
+
+    # Line-level attributes: a product and a bundled row's quantity, discount and margin
+    product = pick(rng, pools["products"], rows)
+    template = base.iloc[rng.integers(0, len(base), size=rows)]
+    quantity = template["Quantity"].to_numpy()
+    discount = template["Discount"].to_numpy()
+    sales = np.round(product["Unit Price"].to_numpy() * quantity * (1 - discount), 4)
+    profit = np.round(sales * template["Margin"].to_numpy(), 4)
+
+    dates = order_dates(days)
+    ship_dates = order_dates(days + shipping["Shipping Days"].to_numpy()[line_order])
+    order_numbers = pd.Series(first_order + line_order)
+    prefixes = pd.Series(np.where(order_numbers % 5 == 0, "US", "CA"))
+    chunk = pd.DataFrame({
+        "Row ID": np.arange(first_row, first_row + rows),
+        "Order ID": (
+            prefixes + "-" + pd.Series(dates.year).astype(str) + "-"
+            + order_numbers.astype(str).str.zfill(7)
+        ),
+        "Order Date": format_dates(dates),
+        "Ship Date": format_dates(ship_dates),
+        "Ship Mode": shipping["Ship Mode"].to_numpy()[line_order],
+        "Customer ID": customer["Customer ID"],
+        "Customer Name": customer["Customer Name"],
+        "Segment": customer["Segment"],
+        "Country": "United States",
+        "City": place["City"],
+        "State": place["State"],
+        "Postal Code": place["Postal Code"],
+        "Region": place["Region"],
+        "Product ID": product["Product ID"],
+        "Category": product["Category"],
+        "Sub-Category": product["Sub-Category"],
+        "Product Name": product["Product Name"],
+        "Sales": sales,
+        "Quantity": quantity,
+        "Discount": discount,
+        "Profit": profit,
+    })
+    return chunk[COLUMNS], orders
+
+
+def generate(rows, seed=0, path=None, source=SOURCE):
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(source, encoding=ENCODING)
+    base["Shipping Days"] = (
+        pd.to_datetime(base["Ship Date"], format="%m/%d/%Y")
+        - pd.to_datetime(base["Order Date"], format="%m/%d/%Y")
+    ).dt.days
+    base["Margin"] = base["Profit"] / base["Sales"]
+
+    scale = max(rows / len(base), 1)
+    customers = customer_pool(rng, base, int(base["Customer ID"].nunique() * scale ** 0.5))
+    products = product_pool(rng, base, int(base["Product ID"].nunique() * scale ** 0.5))
+    geo = geo_pool(rng, base, int(base["Postal Code"].nunique() * scale ** 0.25))
+    pools = {
+        "customers": (customers, popularity(rng, len(customers))),
+        "products": (products, popularity(rng, len(products))),
+        "geo": (geo, popularity(rng, len(geo), skew=1.0)),
+    }
+
+    path = path or data_path(rows, seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    written = 0
+    orders = 0
+    with open(tmp_path, "w", encoding=ENCODING, newline="") as target:
+        while written < rows:
+            chunk_rows = min(CHUNK_ROWS, rows - written)
+            chunk, chunk_orders = generate_chunk(rng, base, pools, written + 1, orders + 1, chunk_rows)
+            chunk.to_csv(target, index=False, header=written == 0)
+            written += chunk_rows
+            orders += chunk_orders
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Superstore CSVs")
+    parser.add_argument("sizes", nargs="+", help="row counts: 10k, 1m, 10m or a number")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+    for size in args.sizes:
+        path = generate(parse_size(size), args.seed, data_path(size, args.seed, args.data_dir))
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
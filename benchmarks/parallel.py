@@ -0,0 +1,76 @@
+# Times a full aggregate rebuild serially and across a process pool, checks both give the
+# same tables and prints the speedup.
+#
+#   python -m benchmarks.parallel                              # 1m rows, one worker per CPU
+#   python -m benchmarks.parallel --sizes 1m 10m --workers 4 --by Region
+#
+# Data comes from benchmarks.generate and is created on first use. The speedup is bounded
+# by the number of partitions: 4 years or 4 regions in the Superstore data.
+import argparse
+import os
+
+import numpy as np
+
+from benchmarks.generate import DATA_DIR, data_path, generate, parse_size
+from benchmarks.run import measure
+from charts.aggregates import AGGREGATES, build_aggregates, build_aggregates_parallel
+from charts.dataset import read_source
+
+
+def same_tables(serial, parallel, columns):
+    # Cube cells never span partitions and come back bit-identical; the product and
+    # customer tables add per-partition sums, so they may differ in the last float bits.
+    # Tables keyed by derived columns (the reach sketch) keep partition order
+    for name, (build, keys, sort, merge) in AGGREGATES.items():
+        expected, actual = serial[name], parallel[name]
+        if not sort:
+            if not set(keys) <= set(columns):
+                expected = expected.sort_values(keys, ignore_index=True)
+                actual = actual.sort_values(keys, ignore_index=True)
+            if not expected.equals(actual):
+                return False
+            continue
+        if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+            return False
+        for column in expected.columns:
+            if expected[column].dtype.kind == "f":
+                if not np.allclose(expected[column], actual[column]):
+                    return False
+            elif not expected[column].equals(actual[column]):
+                return False
+    return True
+
+
+def run(sizes, seed, repeat, data_dir, workers, column):
+    for size in sizes:
+        path = data_path(size, seed, data_dir)
+        if not os.path.exists(path):
+            generate(parse_size(size), seed, path)
+        df = read_source(path)
+        serial = measure(lambda: build_aggregates(df), repeat)
+        parallel = measure(lambda: build_aggregates_parallel(df, workers, column), repeat)
+        same = same_tables(
+            build_aggregates(df), build_aggregates_parallel(df, workers, column), df.columns
+        )
+        print(
+            f"{size:>5} {len(df):>10,} rows  serial {serial['median']:>7.2f}s  "
+            f"{workers} workers by {column} {parallel['median']:>7.2f}s  "
+            f"speedup {serial['median'] / parallel['median']:>5.2f}x  "
+            f"{'same tables' if same else 'TABLES DIFFER'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial and parallel aggregate rebuilds")
+    parser.add_argument("--sizes", nargs="+", default=["1m"], help="10k, 1m, 10m or a row count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--by", default="Year", choices=["Year", "Region"])
+    args = parser.parse_args()
+    run(args.sizes, args.seed, args.repeat, args.data_dir, args.workers, args.by)
+
+
+if __name__ == "__main__":
+    main()
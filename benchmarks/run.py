@@ -0,0 +1,317 @@
+# Times the dashboard's compute paths on synthetic data and stores the results as JSON.
+#
+#   python -m benchmarks.run                         # 10k rows
+#   python -m benchmarks.run --sizes 10k 1m 10m --repeat 3
+#   python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+#   python -m benchmarks.run --sizes 10m --no-baseline
+#
+# Data comes from benchmarks.generate and is created on first use. Every timed call starts
+# with an empty figure cache, so the numbers are for a first render of that filter state.
+# Each operation also runs as it was before any optimization (benchmarks.baseline) on the
+# frame the original app loaded, and the two are printed side by side.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import baseline
+from benchmarks.generate import DATA_DIR, data_path, generate, parse_size
+from charts.aggregates import build_aggregates
+from charts.config import BACKEND, COMPACT_DATASET
+from charts.compute import (
+    calculate_metrics, generate_delivery_analysis, sales_measures, top_10_customer, top_10_products,
+)
+from charts.context import AggregationContext
+from charts.cube import measure_columns, shipping_columns, slice_cube
+from charts.dataset import frame_memory, read_source, served_frame
+from charts.figure_cache import figure_cache, make_filter_key
+from charts.row_index import (
+    build_row_index, date_bounds, filter_date_range, hierarchy_values, select_rows, take_rows,
+)
+from charts.sales import plot_discounted_transactions, plot_loss, plot_quantity
+from charts.ship import generate_shipping_state_map
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+# Ratio to the compared run above which an operation is reported as a regression
+REGRESSION_RATIO = 1.10
+
+
+def scenarios(row_index):
+    # The app's default view, everything, and one state over a whole year
+    latest_year = max(row_index["Year"]["values"])
+    latest_month = max(hierarchy_values(row_index, "Month", year=latest_year))
+    first_day = pd.Timestamp(latest_year, latest_month, 1)
+    return {
+        "latest_month": dict(
+            year=latest_year, month=latest_month,
+            start_date=first_day, end_date=first_day + pd.offsets.MonthEnd(1),
+        ),
+        "all": dict(),
+        "state_year": dict(year=latest_year, region="West", state="California"),
+    }
+
+
+def filter_cascade(data, year=None, month=None, start_date=None, end_date=None,
+                   region=None, state=None, city=None):
+    # The sidebar of app.py: each selectbox narrows the rows the next one lists values from
+    row_index, df, cube, summaries = data["row_index"], data["df"], data["cube"], data["summaries"]
+    hierarchy_values(row_index, "Month", year=year)
+    month_rows = select_rows(row_index, year=year, month=month)
+    min_date, max_date = date_bounds(row_index, month_rows)
+    start_date = min_date if start_date is None else start_date
+    end_date = max_date if end_date is None else end_date
+    date_rows = filter_date_range(row_index, month_rows, start_date, end_date)
+    cascade = dict(year=year, month=month, rows=None if len(date_rows) == len(month_rows) else date_rows)
+    hierarchy_values(row_index, "Region", **cascade)
+    region_rows = select_rows(row_index, region=region, rows=date_rows)
+    hierarchy_values(row_index, "State", region=region, **cascade)
+    hierarchy_values(row_index, "City", region=region, state=state, **cascade)
+    filtered_rows = select_rows(row_index, state=state, city=city, rows=region_rows)
+    filtered_df = take_rows(df, filtered_rows)
+
+    if pd.Timestamp(start_date) <= min_date and pd.Timestamp(end_date) >= max_date:
+        selection = dict(year=year, month=month, region=region, state=state, city=city)
+        filtered_cube = slice_cube(cube, **selection)
+        filtered_shipping = slice_cube(summaries["shipping"], **selection)
+    else:
+        filtered_cube = measure_columns(filtered_df)
+        filtered_shipping = shipping_columns(filtered_df)
+
+    filter_key = make_filter_key(data["name"], year, month, start_date, end_date, region, state, city)
+    return {
+        "filtered_df": filtered_df,
+        "filtered_cube": filtered_cube,
+        "filtered_shipping": filtered_shipping,
+        "cube_year": slice_cube(cube, year=year),
+        "context": AggregationContext(filtered_df, filter_key),
+    }
+
+
+def operations(data, selection):
+    view = filter_cascade(data, **selection)
+    cube, cube_year = data["cube"], view["cube_year"]
+    context = view["context"]
+
+    def plot_loss_discount():
+        # The original plot_loss_discount built these figures for both grains in one call
+        for cells, grain in ((cube, "Year"), (cube_year, "Month")):
+            measures = sales_measures(cells, grain)
+            plot_loss(measures, grain)
+            plot_discounted_transactions(measures, grain)
+            plot_quantity(measures, grain)
+
+    return {
+        "filter_cascade": lambda: filter_cascade(data, **selection),
+        "calculate_metrics": lambda: calculate_metrics(view["filtered_cube"]),
+        "plot_loss_discount": plot_loss_discount,
+        "top_10_products": lambda: top_10_products(context),
+        "generate_delivery_analysis": lambda: generate_delivery_analysis(view["filtered_shipping"]),
+        "generate_shipping_state_map": lambda: generate_shipping_state_map(view["filtered_cube"]),
+        "top_10_customer": lambda: top_10_customer(context),
+    }
+
+
+def baseline_operations(df, selection):
+    # Keyed like operations(); the original display_top_10 is the top_10_products entry
+    view = baseline.filter_cascade(df, **selection)
+    filtered_df, filtered_year = view["filtered_df"], view["filtered_year"]
+    # generate_delivery_analysis adds columns to its argument; it gets its own copy
+    delivery_df = filtered_df.copy()
+    return {
+        "filter_cascade": lambda: baseline.filter_cascade(df, **selection),
+        "calculate_metrics": lambda: baseline.calculate_metrics(filtered_df),
+        "plot_loss_discount": lambda: baseline.plot_loss_discount(filtered_df, df, filtered_year),
+        "top_10_products": lambda: baseline.display_top_10(filtered_df),
+        "generate_delivery_analysis": lambda: baseline.generate_delivery_analysis(delivery_df),
+        "generate_shipping_state_map": lambda: baseline.generate_shipping_state_map(filtered_df),
+        "top_10_customer": lambda: baseline.top_10_customer(filtered_df),
+    }
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        figure_cache.clear()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "repeat": repeat,
+    }
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def load(size, seed, data_dir):
+    path = data_path(size, seed, data_dir)
+    if not os.path.exists(path):
+        generate(parse_size(size), seed, path)
+    full, read_seconds = timed(lambda: read_source(path))
+    summaries, aggregate_seconds = timed(lambda: build_aggregates(full))
+    # The app builds aggregates from the full rows and serves the compact, date-sorted frame
+    df = served_frame(full)
+    row_index, index_seconds = timed(lambda: build_row_index(df))
+    data = {
+        "name": os.path.basename(path),
+        "df": df,
+        "cube": summaries["cube"],
+        "summaries": summaries,
+        "row_index": row_index,
+    }
+    setup = {
+        "read_source": read_seconds,
+        "build_aggregates": aggregate_seconds,
+        "build_row_index": index_seconds,
+    }
+    memory = {"read": frame_memory(full), "served": frame_memory(df)}
+    return data, setup, memory
+
+
+def run_baseline(path, selections, repeat):
+    df, load_seconds = timed(lambda: baseline.load_data(path))
+    result = {"setup": {"load_data": load_seconds}, "scenarios": {}}
+    with warnings.catch_warnings():
+        # The original code sets columns on filtered slices
+        warnings.simplefilter("ignore", pd.errors.SettingWithCopyWarning)
+        for scenario, selection in selections.items():
+            result["scenarios"][scenario] = {
+                name: measure(function, repeat)
+                for name, function in baseline_operations(df, selection).items()
+            }
+    return result
+
+
+def run(sizes, seed, repeat, data_dir, with_baseline=True):
+    results = {}
+    for size in sizes:
+        data, setup, memory = load(size, seed, data_dir)
+        results[size] = {"rows": len(data["df"]), "setup": setup, "memory": memory, "scenarios": {}}
+        selections = scenarios(data["row_index"])
+        for scenario, selection in selections.items():
+            results[size]["scenarios"][scenario] = {
+                name: measure(function, repeat)
+                for name, function in operations(data, selection).items()
+            }
+            print(f"{size} {scenario} done", file=sys.stderr)
+        if with_baseline:
+            del data
+            results[size]["baseline"] = run_baseline(data_path(size, seed, data_dir), selections, repeat)
+            print(f"{size} baseline done", file=sys.stderr)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment():
+    return {
+        "revision": git_revision(),
+        "backend": BACKEND,
+        "compact_dataset": COMPACT_DATASET,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save(report, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(results_dir, f"{stamp}-{report['environment']['revision']}.json")
+    with open(path, "w") as target:
+        json.dump(report, target, indent=2)
+    return path
+
+
+def timings(report):
+    # (size, scenario, operation) -> median seconds
+    return {
+        (size, scenario, operation): timing["median"]
+        for size, result in report["results"].items()
+        for scenario, operations in result["scenarios"].items()
+        for operation, timing in operations.items()
+    }
+
+
+def side_by_side(report):
+    # Each operation before any optimization and now, from the same run
+    print(f"{'size':>5} {'scenario':<13} {'operation':<28} {'original':>10} {'current':>9} {'speedup':>8}")
+    for size, result in report["results"].items():
+        if "baseline" not in result:
+            continue
+        for scenario, operations in result["scenarios"].items():
+            originals = result["baseline"]["scenarios"][scenario]
+            for operation, timing in operations.items():
+                before, after = originals[operation]["median"], timing["median"]
+                print(
+                    f"{size:>5} {scenario:<13} {operation:<28} "
+                    f"{before * 1000:>8.1f}ms {after * 1000:>7.1f}ms {before / after:>7.1f}x"
+                )
+
+
+def compare(report, earlier):
+    current, previous = timings(report), timings(earlier)
+    regressions = 0
+    print(f"{'size':>5} {'scenario':<13} {'operation':<28} {'before':>9} {'after':>9} {'ratio':>6}")
+    for key in sorted(current.keys() & previous.keys()):
+        ratio = current[key] / previous[key] if previous[key] else float("inf")
+        flag = "  slower" if ratio > REGRESSION_RATIO else ""
+        regressions += bool(flag)
+        print(
+            f"{key[0]:>5} {key[1]:<13} {key[2]:<28} "
+            f"{previous[key] * 1000:>7.1f}ms {current[key] * 1000:>7.1f}ms {ratio:>6.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Superstore dashboard compute paths")
+    parser.add_argument("--sizes", nargs="+", default=["10k"], help="10k, 1m, 10m or a row count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument(
+        "--no-baseline", action="store_true", help="skip the original implementations (slow at 10m rows)"
+    )
+    args = parser.parse_args()
+
+    report = {
+        "environment": environment(),
+        "seed": args.seed,
+        "results": run(args.sizes, args.seed, args.repeat, args.data_dir, not args.no_baseline),
+    }
+    side_by_side(report)
+    print(save(report, args.results_dir))
+    if args.compare:
+        with open(args.compare) as source:
+            regressions = compare(report, json.load(source))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()